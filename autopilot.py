@@ -0,0 +1,204 @@
+"""A planning autopilot for the Crossy Road clone.
+
+Each frame the chicken stands still, the autopilot searches a time-expanded
+grid of (column, lane, step) states built from the closed-form entity
+predictions in main.py, using the same rules as Player.move: no backward
+moves, trees block, and a hop lands 5 steps later (0.2 progress per step),
+with the chicken untouchable in the air. The search stops at a fixed
+per-frame time budget and plays the first move of the best plan found.
+
+Run ``python autopilot.py`` for attract mode, or ``--headless --games N``
+to soak-test the simulation.
+"""
+import argparse
+import time
+
+import main
+
+HOP_STEPS = 5  # Player.update adds 0.2 progress per step
+
+
+class Autopilot:
+    # Call it with a Game once per simulation step; returns the action to play
+    def __init__(self, budget=0.002, horizon=40, lookahead=5, spread=3):
+        # budget: seconds of search per step; horizon: steps planned ahead
+        # (keep it within Train.warning_duration, so trains are foreseen);
+        # lookahead/spread: lanes ahead and columns either side of the
+        # chicken worth planning into
+        self.budget = budget
+        self.horizon = horizon
+        self.lookahead = lookahead
+        self.spread = spread
+        self.last_time = 0.0  # Seconds the last search took
+        self.expanded = 0     # States the last search expanded
+        # Road and river forecasts by game frame, then lane: entities never
+        # change speed, so they stay valid from one search to the next
+        self.forecasts = {}
+        self.lanes = None
+
+    def __call__(self, game):
+        if game.game_over or game.player.moving:
+            return None
+        start = time.perf_counter()
+        # Stop searching with a tenth of the budget left to pick the plan
+        action = self.plan(game, start + self.budget * 0.9)
+        self.last_time = time.perf_counter() - start
+        return action
+
+    def plan(self, game, deadline):
+        player = game.player
+        y0 = player.grid_y
+        if game.entities is not None:
+            game.entities.sync(y0, y0 + self.lookahead + 1)
+        # The lanes worth planning on, by distance ahead, and their tree masks
+        self.band = [game.lanes.get(y) for y in range(y0, y0 + self.lookahead + 1)]
+        # (-1 has every bit set: lanes not generated yet, or past the
+        # lookahead, are never hopped onto)
+        trees = [lane.blocked if lane is not None else -1 for lane in self.band]
+        trees.append(-1)
+        if game.lanes is not self.lanes:  # A new run
+            self.lanes = game.lanes
+            self.forecasts = {}
+        for frame in [frame for frame in self.forecasts if frame <= game.frame]:
+            del self.forecasts[frame]
+        self.frame = game.frame
+        self.trains = {}  # Train forecasts only hold for this search
+        low = max(0, player.grid_x - self.spread)
+        high = min(main.GRID_WIDTH - 0.001, player.grid_x + self.spread)
+        rest = player.max_idle_time
+        # Eagle: waiting is only safe until the idle timer runs out
+        idle_left = player.max_idle_time - player.idle_timer if game.game_started else self.horizon
+
+        # layers[t] maps (lanes ahead, column key) -> (x, lanes ahead, first action, idle steps left)
+        layers = [dict() for _ in range(self.horizon + HOP_STEPS + 1)]
+        layers[0][(0, 0)] = (player.grid_x, 0, None, idle_left)
+        visit = self.visit
+        self.expanded = 0
+        for t in range(self.horizon):
+            landing = layers[t + HOP_STEPS]
+            for x, d, first, idle in layers[t].values():
+                if time.perf_counter() > deadline:
+                    return self.choose(layers, t)
+                self.expanded += 1
+                if idle > 1:
+                    visit(layers[t + 1], t + 1, x, d, first or "none", idle - 1)
+                # Player.move's checks: no backward moves, stay on the board and out of trees
+                if 0 <= x < main.GRID_WIDTH and not trees[d + 1] >> int(round(x)) & 1:
+                    visit(landing, t + HOP_STEPS, x, d + 1, first or "up", rest)
+                if x - 1 >= low and not trees[d] >> int(round(x - 1)) & 1:
+                    visit(landing, t + HOP_STEPS, x - 1, d, first or "left", rest)
+                if x + 1 <= high and not trees[d] >> int(round(x + 1)) & 1:
+                    visit(landing, t + HOP_STEPS, x + 1, d, first or "right", rest)
+        return self.choose(layers, self.horizon)
+
+    def choose(self, layers, t):
+        # Every state at step t or in the air past it has survived to t; take
+        # the first action towards the furthest lane, nearest the middle. If
+        # nothing lasts that long, settle for whatever survives longest.
+        for t in range(t, 0, -1):
+            best = None
+            for layer in layers[t:t + HOP_STEPS]:
+                for x, d, first, _ in layer.values():
+                    rank = (d, -abs(x - main.GRID_WIDTH / 2))
+                    if best is None or rank > best[0]:
+                        best = (rank, first)
+            if best is not None:
+                return best[1] if best[1] != "none" else None
+        return "up"  # Doomed whatever we do; moving at least resets the eagle
+
+    def visit(self, layer, t, x, d, first, idle):
+        # Land the chicken at x on lane d at step t, as check_collisions would,
+        # and keep the state if it survives (logs carry it along)
+        lane = self.band[d]
+        kind = lane.type
+        if kind != "grass":
+            if kind == "train":
+                cache = self.trains.get(t)
+                if cache is None:
+                    cache = self.trains[t] = {}
+            else:
+                cache = self.forecasts.get(self.frame + t)
+                if cache is None:
+                    cache = self.forecasts[self.frame + t] = {}
+            hazards = cache.get(lane.y)
+            if hazards is None:
+                hazards = cache[lane.y] = self.forecast(lane, t)
+            if kind == "road":
+                for vx, width in hazards:
+                    if vx <= x <= vx + width:
+                        return
+            elif kind == "river":
+                for lx, length, velocity in hazards:
+                    if lx <= x < lx + length:
+                        x += velocity
+                        break
+                else:
+                    return
+                if not -0.5 <= x < main.GRID_WIDTH + 0.5:
+                    return
+            elif hazards:
+                active, tx, length = hazards
+                if active and tx <= x < tx + length:
+                    return
+        key = (d, round(x * 4))
+        if key not in layer:
+            layer[key] = (x, d, first, idle)
+
+    def forecast(self, lane, t):
+        # The lane's hazards t steps from now (a dormant lane is further behind)
+        t += self.frame - lane.frame
+        if lane.type == "road":
+            return [(vehicle.position_after(t), vehicle.width) for vehicle in lane.vehicles]
+        if lane.type == "river":
+            return [(log.position_after(t), log.length, log.speed * log.direction)
+                    for log in lane.logs]
+        if lane.train:
+            train = lane.train
+            if train.warning_timer and t >= train.warning_timer:
+                # The warning may start over and hold the train back, so
+                # from its earliest arrival on it may be anywhere on the track
+                return True, -1.0, main.GRID_WIDTH + 2.0
+            active, x, _ = train.state_after(t)
+            return active, x, train.length
+        return None
+
+
+def soak(args):
+    # Headless autopilot games, reporting score, cause and planning cost
+    pilot = Autopilot(budget=args.budget / 1000)
+    worst = total = plans = 0
+    for index in range(args.games):
+        game = main.Game(headless=True, engine=args.engine,
+                         seed=None if args.seed is None else args.seed + index)
+        while not game.game_over and game.frame < args.max_frames:
+            game.step(pilot(game))
+            if pilot.last_time:
+                plans += 1
+                total += pilot.last_time
+                worst = max(worst, pilot.last_time)
+                pilot.last_time = 0.0
+        print(f"game {index}: seed {game.seed} score {game.score} "
+              f"{game.death_cause or 'timeout'} after {game.frame} frames")
+    if plans:
+        print(f"planning: mean {total / plans * 1000:.2f} ms, worst {worst * 1000:.2f} ms "
+              f"over {plans} plans")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--headless", action="store_true", help="soak-test without a window")
+    parser.add_argument("--games", type=int, default=10, help="headless games to play")
+    parser.add_argument("--max-frames", type=int, default=20000, help="frame cap per headless game")
+    parser.add_argument("--budget", type=float, default=2.0, help="planning budget per frame, in ms")
+    parser.add_argument("--engine", choices=["objects", "numpy"], default="objects")
+    parser.add_argument("--seed", type=int, help="first world seed")
+    args = parser.parse_args()
+    if args.headless:
+        soak(args)
+    else:
+        game = main.Game(engine=args.engine, seed=args.seed)
+        game.run(pilot=Autopilot(budget=args.budget / 1000))
+
+
+if __name__ == "__main__":
+    main_cli()
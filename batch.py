@@ -0,0 +1,164 @@
+"""Play many headless games across all cores to evaluate difficulty and balance.
+
+Each game runs the real ``Game.update`` logic, seeded and driven by a
+scripted policy. Sweep the balance knobs with ``--param``:
+
+    python batch.py --games 2000 --policy hopper \\
+        --param difficulty_gain=0.1,0.2,0.4 --param speed_jitter=0.7:1.3,0.5:1.5
+
+Every combination of parameter values is one parameter set; all sets play
+the same seeds, so their survival distributions and cause-of-death
+breakdowns can be compared directly.
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import time
+
+import main
+
+# Frames a policy can go without dying before its game is cut off
+DEFAULT_MAX_FRAMES = 5000
+
+
+def random_policy(game, rng):
+    # Mashes keys with a bias towards forward
+    return rng.choice(["up", "up", "up", "left", "right", "none", "none"])
+
+
+def forward_policy(game, rng):
+    # Always runs straight ahead
+    return "up"
+
+
+def hopper_policy(game, rng):
+    # Moves forward when the lane ahead looks clear, otherwise waits or sidesteps
+    player = game.player
+    if player.moving:
+        return None
+    ahead = game.lanes.get(player.grid_y + 1)
+    if ahead is None:
+        return "up"
+    column = player.grid_x
+    if ahead.has_obstacle_at(int(round(column))):
+        return rng.choice(["left", "right"])
+    if ahead.type == "road":
+        for vehicle in ahead.vehicles:
+            # Wait for anything that sweeps over our column within ~10 frames
+            travel = vehicle.speed * vehicle.direction * 10
+            low = min(vehicle.x, vehicle.x + travel) - 0.5
+            high = max(vehicle.x, vehicle.x + travel) + vehicle.width + 0.5
+            if low <= column <= high:
+                return None
+    elif ahead.type == "river":
+        if not any(log.x + 0.2 <= column <= log.x + log.length - 0.2 for log in ahead.logs):
+            return None
+    elif ahead.type == "train" and (ahead.train.active or ahead.train.warning_timer > 0):
+        return None
+    return "up"
+
+
+POLICIES = {
+    "forward": forward_policy,
+    "hopper": hopper_policy,
+    "random": random_policy,
+}
+
+
+def play(tuning, policy, seed, max_frames):
+    # One headless game; returns (score, death cause, frames)
+    game = main.Game(headless=True, seed=seed, tuning=main.Tuning(**tuning))
+    rng = random.Random(seed ^ 0x5EED)
+    choose = POLICIES[policy]
+    while not game.game_over and game.frame < max_frames:
+        game.step(choose(game, rng))
+    return game.score, game.death_cause or "timeout", game.frame
+
+
+def play_batch(tuning, policy, seeds, max_frames):
+    # A worker's share of games; batching keeps IPC off the per-game path
+    return [play(tuning, policy, seed, max_frames) for seed in seeds]
+
+
+def parse_param(text):
+    # "name=v1,v2,..." -> (name, [values]); "lo:hi" values become tuples
+    name, _, values = text.partition("=")
+    if name not in main.Tuning().as_dict() or not values:
+        raise argparse.ArgumentTypeError(
+            f"expected NAME=V1,V2,... with NAME one of {', '.join(sorted(main.Tuning().as_dict()))}")
+    parsed = []
+    for value in values.split(","):
+        try:
+            parsed.append(tuple(float(part) for part in value.split(":")) if ":" in value
+                          else float(value))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad value {value!r} for {name}") from None
+    return name, parsed
+
+
+def parameter_sets(params):
+    names = [name for name, _ in params]
+    for values in itertools.product(*(values for _, values in params)):
+        yield dict(zip(names, values))
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(overrides, results):
+    scores = sorted(score for score, _, _ in results)
+    causes = {}
+    for _, cause, _ in results:
+        causes[cause] = causes.get(cause, 0) + 1
+    label = ", ".join(f"{name}={value}" for name, value in overrides.items()) or "defaults"
+    print(label)
+    print(f"  distance: mean {sum(scores) / len(scores):.1f}  "
+          + "  ".join(f"p{int(fraction * 100)} {percentile(scores, fraction)}"
+                      for fraction in (0.1, 0.25, 0.5, 0.75, 0.9))
+          + f"  max {scores[-1]}")
+    print("  deaths:   " + "  ".join(f"{cause} {count / len(results):.1%}"
+                                     for cause, count in sorted(causes.items(), key=lambda item: -item[1])))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=1000, help="games per parameter set")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="hopper")
+    parser.add_argument("--param", type=parse_param, action="append", default=[],
+                        help="tuning knob and the values to sweep, e.g. difficulty_gain=0.1,0.2")
+    parser.add_argument("--seed", type=int, default=0, help="first game seed")
+    parser.add_argument("--max-frames", type=int, default=DEFAULT_MAX_FRAMES)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.games)
+    # A few batches per worker balances load without per-game IPC
+    size = max(1, args.games // (args.jobs * 4))
+    batches = [seeds[i:i + size] for i in range(0, len(seeds), size)]
+    sets = list(parameter_sets(args.param))
+    tasks = [(overrides, args.policy, batch, args.max_frames) for overrides in sets for batch in batches]
+
+    start = time.perf_counter()
+    # Spawned workers, shut down with close()/join(); see replay.py
+    with multiprocessing.get_context("spawn").Pool(args.jobs) as pool:
+        results = pool.starmap(play_batch, tasks)
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+
+    for index, overrides in enumerate(sets):
+        games = [game for batch in results[index * len(batches):(index + 1) * len(batches)]
+                 for game in batch]
+        report(overrides, games)
+    total = len(sets) * args.games
+    frames = sum(game[2] for batch in results for game in batch)
+    print(f"{total} games, {frames} frames in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} games/s on {args.jobs} workers)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,712 @@
+"""Performance benchmarks for the Crossy Road clone.
+
+Run ``python bench.py <benchmark>``. Worlds are built under SDL's dummy
+video driver, so no window is opened.
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import concurrent.futures
+import gc
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+import pygame
+
+import main
+
+
+def teleport(game, lane_y):
+    # Put the chicken (and camera) on lane_y as if it had walked there
+    player = game.player
+    player.grid_y = player.y = player.target_y = lane_y
+    player.moving = False
+    player.on_log = False
+    player.current_log = None
+    game.camera_y = game.camera_target_y = max(0, lane_y - 2)
+    game.max_progress = lane_y
+    game.game_started = True
+
+
+def keep_alive(game):
+    # Benchmarks measure frame cost, not survival
+    game.game_over = False
+    game.player.alive = True
+    game.player.idle_timer = 0
+
+
+def time_frames(game, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        game.update()
+        keep_alive(game)
+    return (time.perf_counter() - start) / frames
+
+
+def bench_lanes(args):
+    # Per-frame update cost and memory should stay flat with distance travelled
+    random.seed(args.seed)
+    game = main.Game()
+    print(f"{'distance':>10} {'live lanes':>11} {'ms/frame':>9}")
+    for distance in args.distances:
+        teleport(game, distance)
+        time_frames(game, 30)  # Generate and settle the new window
+        per_frame = time_frames(game, args.frames)
+        print(f"{distance:>10} {game.lanes.live_count():>11} {per_frame * 1000:>9.3f}")
+
+
+def entity_state(game):
+    # Every live entity's position and train state, in lane order
+    if game.entities is not None:
+        game.entities.sync()
+    state = []
+    for lane in game.lanes:
+        state.extend(vehicle.x for vehicle in lane.vehicles)
+        state.extend(log.x for log in lane.logs)
+        if lane.train:
+            state.append((lane.train.x, lane.train.active, lane.train.warning_timer))
+    return state
+
+
+def scripted_run(engine, seed, frames, check_every=0):
+    # Play a seeded game with a seeded random policy; returns (seconds, trace)
+    random.seed(seed)
+    policy = random.Random(seed + 1)
+    game = main.Game(headless=True, engine=engine)
+    trace = []
+    elapsed = 0.0
+    for frame in range(frames):
+        action = policy.choice(["up", "up", "up", "left", "right", "none", "none"])
+        start = time.perf_counter()
+        result = game.step(action)
+        elapsed += time.perf_counter() - start
+        if check_every and frame % check_every == 0:
+            trace.append((result, entity_state(game)))
+        if game.game_over:
+            trace.append(("death", result))
+            game.reset()
+    return elapsed, trace
+
+
+def bench_engine(args):
+    # The NumPy engine must reproduce the object engine exactly under one seed
+    _, expected = scripted_run("objects", args.seed, args.frames, check_every=10)
+    _, actual = scripted_run("numpy", args.seed, args.frames, check_every=10)
+    for index, (want, got) in enumerate(zip(expected, actual)):
+        if want != got:
+            raise SystemExit(f"engines diverged at checkpoint {index}: {want!r} != {got!r}")
+    if len(expected) != len(actual):
+        raise SystemExit("engines produced different numbers of checkpoints")
+    deaths = sum(1 for entry in expected if entry[0] == "death")
+    print(f"identical over {args.frames} frames ({len(expected)} checkpoints, {deaths} deaths)")
+
+    for engine in ("objects", "numpy"):
+        elapsed, _ = scripted_run(engine, args.seed, args.frames)
+        print(f"{engine:>8}: {elapsed / args.frames * 1e6:8.2f} us/frame")
+
+
+def traffic_world(seed, **game_args):
+    # A window whose every visible lane is busy: roads, rivers and running trains
+    random.seed(seed)
+    game = main.Game(**game_args)
+    game.lanes = main.LaneWindow()
+    for y in range(main.GRID_HEIGHT + 20):
+        lane_type = ("road", "road", "river", "road", "train")[y % 5]
+        lane = main.Lane(y, lane_type, random.choice([1, -1]), main.INITIAL_VEHICLE_SPEED)
+        if lane.train:
+            lane.train.active = True
+            lane.train.x = random.uniform(0, main.GRID_WIDTH - lane.train.length)
+        game.lanes.append(lane)
+    return game
+
+
+def time_draws(game, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        game.draw()
+    return (time.perf_counter() - start) / frames
+
+
+def bench_draw(args):
+    # Game.draw with a full screen of traffic for each renderer configuration
+    baseline = None
+    for render_mode in ("full", "static"):
+        for sprites in (False, True):
+            game = traffic_world(args.seed, sprites=sprites, render_mode=render_mode)
+            time_draws(game, 10)  # Warm up (and fill the sprite cache)
+            per_draw = time_draws(game, args.frames)
+            if baseline is None:
+                baseline = per_draw
+            label = f"{render_mode} + {'sprites' if sprites else 'primitives'}"
+            print(f"{label:>20}: {per_draw * 1000:7.3f} ms/draw "
+                  f"({(1 - per_draw / baseline) * 100:3.0f}% less than full + primitives)")
+
+
+class AllocationCounter:
+    # Counts pygame Surface/Font objects created while installed, including
+    # the surfaces returned by Font.render
+    def __init__(self):
+        self.count = 0
+
+    def install(self):
+        counter = self
+        real_surface, real_font = pygame.Surface, pygame.font.Font
+
+        class CountingSurface(real_surface):
+            def __init__(self, *args, **kwargs):
+                counter.count += 1
+                super().__init__(*args, **kwargs)
+
+        class CountingFont(real_font):
+            def __init__(self, *args, **kwargs):
+                counter.count += 1
+                super().__init__(*args, **kwargs)
+
+            def render(self, *args, **kwargs):
+                counter.count += 1
+                return super().render(*args, **kwargs)
+
+        self.restore = (real_surface, real_font)
+        pygame.Surface, pygame.font.Font = CountingSurface, CountingFont
+
+    def uninstall(self):
+        pygame.Surface, pygame.font.Font = self.restore
+
+
+def hud_states(game):
+    # Put the game in each HUD state in turn
+    player = game.player
+    game.game_started = True
+    player.idle_timer = 0
+    yield "playing"
+    player.idle_timer = player.max_idle_time - 50  # Shadow plus flashing text
+    yield "eagle warning"
+    game.game_over = True
+    yield "game over"
+
+
+def bench_hud(args):
+    # Steady-state HUD drawing should allocate (next to) nothing per frame
+    counter = AllocationCounter()
+    counter.install()
+    try:
+        game = main.Game()
+        game.draw()
+        print(f"first frame: {counter.count} pygame objects (fonts, fixed text, sprites)")
+        failed = False
+        for state in hud_states(game):
+            game.hud.draw(game.screen, game)  # Settle anything state-specific
+            counter.count = 0
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            for _ in range(args.frames):
+                game.hud.draw(game.screen, game)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            per_frame = counter.count / args.frames
+            print(f"{state:>14}: {per_frame:.3f} pygame objects/frame, "
+                  f"{current - base} B retained, {peak - base} B peak over {args.frames} frames")
+            failed = failed or per_frame > 0
+    finally:
+        counter.uninstall()
+    if failed:
+        raise SystemExit("HUD allocated pygame objects in steady state")
+
+
+def bench_quality(args):
+    # Game.draw at each render quality level, with the eagle warning up, and
+    # the governor's response to a load that rises, falls and sits on a level
+    # boundary (time is simulated, so this part runs instantly)
+    for render_mode, sprites in (("static", True), ("full", False)):
+        baseline = None
+        for level, name in enumerate(main.QUALITY_NAMES):
+            game = traffic_world(args.seed, sprites=sprites, render_mode=render_mode, quality=level)
+            game.game_started = True
+            game.player.idle_timer = game.player.max_idle_time - 100  # Shadow, no text
+            time_draws(game, 10)
+            per_draw = time_draws(game, args.frames)
+            if baseline is None:
+                baseline = per_draw
+            label = f"{render_mode} + {'sprites' if sprites else 'primitives'}, {level} {name}"
+            print(f"{label:>40}: {per_draw * 1000:7.3f} ms/draw "
+                  f"({(1 - per_draw / baseline) * 100:3.0f}% less than full)")
+    
+    # Simulated work per frame at each level, as a share of the budget, times a load
+    cost = (1.0, 0.85, 0.7, 0.6, 0.5)
+    loads = [0.5] * 300 + [1.4] * 600 + [1.15] * 1200 + [0.5] * 1200
+    governor = main.QualityGovernor(budget=main.SIM_DT)
+    levels = []
+    for load in loads:
+        levels.append(governor.update(cost[governor.level] * load * main.SIM_DT))
+    print(f"governor over {len(loads)} simulated frames: {governor.changes} level changes; "
+          "level at the end of each load: "
+          + ", ".join(f"{load:g}x -> {levels[end - 1]}" for load, end
+                      in ((0.5, 300), (1.4, 900), (1.15, 2100), (0.5, 3300))))
+
+
+def log_laps(lane):
+    # Steps a log of each length in the lane takes to go round once
+    return {log.length: int((main.GRID_WIDTH + 2 * log.length) // lane.speed) + 1
+            for log in lane.logs}
+
+
+def bench_rivers(args):
+    # Every river lane the generator accepts above another river must keep
+    # reach_after's promise at every point of its cycle, not just as spawned:
+    # each lane is stepped until every log has wrapped once, then through
+    # the logs' shared period, checking the drift over the ride below still
+    # covers the largest gap
+    tuning = main.Tuning()
+    accepted = mixed = broken = 0
+    worst = float("-inf")
+    steps_run = 0
+    start = time.perf_counter()
+    for seed in range(args.seed, args.seed + args.seeds):
+        reach = (1 << main.START_COLUMN, None)
+        previous = None
+        for index in range(8):
+            lanes, previous = main.generate_chunk(seed, index, index * main.CHUNK_LANES,
+                                                  previous, tuning)
+            for lane in lanes:
+                below, reach = reach, main.reach_after(lane, reach)
+                columns, velocity = below
+                if lane.type != "river" or velocity is None:
+                    continue
+                accepted += 1
+                laps = log_laps(lane)
+                mixed += len(laps) > 1
+                ride = (columns.bit_length() - (columns & -columns).bit_length() + 1) / abs(velocity)
+                cover = abs(velocity - lane.speed * lane.direction) * ride
+                period = max(laps.values()) + math.lcm(*laps.values())
+                excess = main.largest_gap(lane.logs) - cover
+                for _ in range(period):
+                    for log in lane.logs:
+                        log.update()
+                    excess = max(excess, main.largest_gap(lane.logs) - cover)
+                steps_run += period
+                worst = max(worst, excess)
+                broken += excess > 0
+    elapsed = time.perf_counter() - start
+    print(f"{accepted} river-after-river lanes accepted over {args.seeds} seeds "
+          f"({mixed} with mixed log lengths), {steps_run} steps in {elapsed:.1f} s")
+    print(f"{broken} later break the inequality that accepted them; "
+          f"largest gap minus drift at worst {worst:+.2f} tiles")
+    if broken:
+        raise SystemExit(f"{broken} accepted river lane(s) can leave the chicken no log to land on")
+
+
+def bench_band(args):
+    # Per-frame cost should follow the active band, not the lanes kept alive
+    print(f"{'band':>10} {'active':>7} {'live lanes':>11} {'us/frame':>9}")
+    for band in (main.ACTIVE_BAND, (1, 8), (0, 3)):
+        random.seed(args.seed)
+        game = main.Game(headless=True, active_band=band)
+        teleport(game, 100)
+        time_frames(game, 30)
+        per_frame = time_frames(game, args.frames)
+        lo, hi = game.active_range()
+        print(f"{str(band):>10} {hi - lo:>7} {game.lanes.live_count():>11} {per_frame * 1e6:>9.1f}")
+
+
+def soak_run(args, pooling, trace_memory):
+    # A whole session with the chicken moving a lane every hop's worth of
+    # frames (trees and deaths aside), so lanes keep streaming through
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()  # Before the game, so its world counts too
+    random.seed(args.seed)
+    game = main.Game(headless=True, seed=args.seed, pooling=pooling)
+    frames = int(args.minutes * 60 * main.FPS)
+    monitor = main.GcMonitor()
+    monitor.install()
+    long_frames = gc_frames = 0
+    worst = 0.0
+    try:
+        for frame in range(frames):
+            if frame % 5 == 0:
+                teleport(game, game.player.grid_y + 1)
+            start = time.perf_counter()
+            game.step()
+            keep_alive(game)
+            elapsed = time.perf_counter() - start
+            if monitor.take_frame():
+                gc_frames += 1
+            if elapsed > args.long_frame / 1000:
+                long_frames += 1
+            worst = max(worst, elapsed)
+    finally:
+        monitor.uninstall()
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    if trace_memory:
+        return peak
+    return frames, game, monitor, long_frames, gc_frames, worst
+
+
+def bench_soak(args):
+    # A long automated session with and without object pooling: GC
+    # collections and pauses, long frames, and peak traced memory
+    for pooling in (False, True):
+        frames, game, monitor, long_frames, gc_frames, worst = soak_run(args, pooling, False)
+        peak = soak_run(args, pooling, True)
+        print(f"{'pooled' if pooling else 'unpooled'}: {frames} frames, {len(game.lanes)} lanes")
+        print(f"  gc collections (gen 0/1/2): {'/'.join(map(str, monitor.collections))} "
+              f"in {gc_frames} frames, {monitor.pause * 1000:.1f} ms total, "
+              f"{monitor.max_pause * 1000:.3f} ms worst")
+        print(f"  frames over {args.long_frame} ms: {long_frames}, worst {worst * 1000:.2f} ms")
+        print(f"  peak traced memory: {peak / 1024:.0f} KiB")
+        if pooling:
+            # Spares are held on purpose, so pooling adds them to the traced peak
+            spares = sum(len(free) for free in game.pool.free.values())
+            print(f"  pool: {game.pool.created} objects created, {game.pool.reused} reused, "
+                  f"{spares} spare at the end")
+
+
+def bench_snapshot(args):
+    # Snapshot/restore round trips: branching again and again from one state,
+    # as a search bot does, and switching between two unrelated worlds,
+    # which rebuilds every lane
+    snapshots = []
+    for seed in (args.seed, args.seed + 1):
+        random.seed(seed)
+        game = main.Game(headless=True, seed=seed)
+        teleport(game, 100)
+        time_frames(game, 30)
+        snapshots.append(game.snapshot())
+    switching = iter(snapshots * args.frames)
+    print(f"{len(snapshots[0].lanes)} live lanes")
+    for label, action in (("snapshot", game.snapshot),
+                          ("restore, same state", lambda: game.restore(snapshots[1])),
+                          ("restore, new world", lambda: game.restore(next(switching)))):
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            action()
+        print(f"{label:>20}: {(time.perf_counter() - start) / args.frames * 1e6:7.1f} us")
+
+
+def bench_rl(args):
+    # Vectorized environment throughput on one core, with random actions,
+    # for grid observations and for pixel frames
+    import numpy as np
+    import rl_env
+    actions = np.random.default_rng(args.seed).integers(0, len(main.ACTION_CODES), (args.frames, 64))
+    setups = [(f"{num_envs} envs, grid", num_envs, {}) for num_envs in (1, 8, 64)]
+    setups += [("8 envs, 800x600 rgb", 8, {"pixels": True}),
+               ("8 envs, 84x84 gray", 8, {"pixels": True, "pixel_size": (84, 84), "grayscale": True}),
+               ("8 envs, 84x84 gray/4", 8,
+                {"pixels": True, "pixel_size": (84, 84), "grayscale": True, "render_every": 4})]
+    print(f"{'setup':>22} {'steps/s':>9} {'us/step':>8} {'episodes':>9}")
+    for label, num_envs, options in setups:
+        env = rl_env.VecEnv(num_envs, seed=args.seed, **options)
+        obs = env.reset()
+        frames = env.frames
+        episodes = 0
+        start = time.perf_counter()
+        for row in actions:
+            result = env.step(row[:num_envs])
+            episodes += int((result[4]["episode_score"] >= 0).sum())
+        elapsed = time.perf_counter() - start
+        # Observations and frames are written in place, never copied
+        assert result[0] is obs and env.frames is frames
+        steps = args.frames * num_envs
+        print(f"{label:>22} {steps / elapsed:>9.0f} {elapsed / steps * 1e6:>8.1f} {episodes:>9}")
+
+
+def tap_keys(game, seconds, seed, done):
+    # Fast tapping, mostly forwards, from another thread: key events stamped
+    # as they are posted, SPACE after a death, then QUIT
+    taps = random.Random(seed)
+    keys = [pygame.K_UP] * 4 + [pygame.K_LEFT, pygame.K_RIGHT]
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        time.sleep(taps.uniform(0.03, 0.15))
+        key = pygame.K_SPACE if game.game_over else taps.choice(keys)
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key,
+                                             timestamp=time.perf_counter()))
+        done[0] += key != pygame.K_SPACE
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+
+def bench_input(args):
+    # Key-down to first drawn motion through the real run() loop, with keys
+    # read once a frame and presses mid-hop dropped (the old pipeline), then
+    # with the buffered, polled one. Presses made standing still and those
+    # that waited for a hop to land are reported apart.
+    seconds = args.frames / main.FPS
+    print(f"{'pipeline':>10} {'presses':>8} {'moves':>6} {'dropped':>8} {'':>9} "
+          f"{'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>7}")
+    for label, options in (("per frame", {"input_buffer": 0, "input_poll": None}),
+                           ("buffered", {})):
+        game = main.Game(seed=args.seed, **options)
+        presses = [0]
+        tapper = threading.Thread(target=tap_keys, args=(game, seconds, args.seed, presses))
+        tapper.start()
+        try:
+            game.run()
+        except SystemExit:
+            pass
+        tapper.join()
+        queue = game.input
+        print(f"{label:>10} {presses[0]:>8} {len(queue.latencies):>6} {queue.dropped:>8}", end="")
+        for kind, buffered in (("standing", False), ("mid-hop", True)):
+            latency = queue.percentiles(buffered=buffered)
+            print(f"{'':>34}" if buffered else "", f"{kind:>9} "
+                  + " ".join(f"{latency.get(point, 0.0):>7.1f}" for point in (50, 90, 99, "max")))
+
+
+# A cold start in a fresh interpreter: build a game, show one frame (the
+# posted QUIT ends run() after it) and report when that frame was shown
+STARTUP_SCRIPT = """
+{prelude}
+import json
+import math
+import main
+game = main.Game()
+pygame.event.post(pygame.event.Event(pygame.QUIT))
+try:
+    game.run()
+except SystemExit:
+    print(json.dumps(dict(game.startup, shown=main.STARTED + game.startup["total"])))
+"""
+STARTUP_REPEATS = 5
+
+
+def bench_startup(args):
+    # Launch to first frame, best of --repeats cold starts, with pygame.init()
+    # run before main is imported (as main used to at import) and without
+    # it. perf_counter is system-wide here, so the child's frame time can be
+    # set against the launch time.
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'startup':>12} {'launch':>8} {'import':>8} {'init':>8} {'game':>8} "
+          f"{'frame':>8} {'total ms':>9}")
+    for label, prelude in (("pygame.init", "import pygame; pygame.init()"),
+                           ("lazy", "import pygame")):
+        best = None
+        for _ in range(args.repeats or STARTUP_REPEATS):
+            launched = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT.format(prelude=prelude)],
+                                    cwd=here, capture_output=True, text=True, check=True).stdout
+            startup = json.loads(output.splitlines()[-1])
+            startup["launch"] = startup["shown"] - launched
+            if best is None or startup["launch"] < best["launch"]:
+                best = startup
+        # launch: interpreter start to first frame; total: main's import to it
+        print(f"{label:>12} " + " ".join(f"{best[name] * 1000:>8.1f}" for name in
+                                         ("launch", "import", "init", "game", "first_frame"))
+              + f" {best['total'] * 1000:>9.1f}")
+
+
+# Regression suite worlds: (live lanes, vehicles per road, lanes travelled)
+SUITE_WORLDS = {
+    "small": (35, 3, 0),
+    "busy": (35, 8, 1000),
+    "long": (100, 4, 20000),
+}
+SUITE_LANE_TYPES = ("grass", "road", "road", "river", "road", "train")
+SUITE_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+SUITE_REPEATS = 15
+# Slowdowns smaller than this (in seconds) are never a regression: on paths
+# that take a microsecond or two, scheduler noise alone is tens of percent
+SUITE_NOISE_FLOOR = 1e-6
+
+
+def sized_world(seed, lanes, vehicles, distance):
+    # A drawn Game with `lanes` live lanes around the chicken at `distance`,
+    # all of them simulated, and `vehicles` evenly spaced vehicles per road
+    random.seed(seed)
+    game = main.Game(seed=seed, active_band=(main.LANE_KEEP_BEHIND, lanes))
+    teleport(game, distance)
+    game.game_started = False  # Holds the camera, so the window stays put
+    first = int(game.camera_y) - main.LANE_KEEP_BEHIND
+    game.lanes = main.LaneWindow(lanes, first)
+    game.train_events = []
+    spacing = (main.GRID_WIDTH + 4) / vehicles
+    for y in range(first, first + lanes):
+        lane_type = SUITE_LANE_TYPES[y % len(SUITE_LANE_TYPES)]
+        direction = game.rng.choice([1, -1])
+        lane = game.new_lane(y, lane_type, direction, main.INITIAL_VEHICLE_SPEED)
+        if lane_type == "road":
+            lane.vehicles = [main.Vehicle(i * spacing - 2, y, lane.speed, direction,
+                                          ("car", "truck")[i % 2]) for i in range(vehicles)]
+        game.add_lane(lane)
+    game.generator.reset(seed, first + lanes)  # Generate on from the end of the window
+    return game
+
+
+def median_of(repeats, measure):
+    # Median of several runs, with the collector held off while they run (as
+    # timeit does), so one disturbed run can't move the result either way
+    gc.collect()
+    gc.disable()
+    try:
+        return statistics.median(measure() for _ in range(repeats))
+    finally:
+        gc.enable()
+
+
+def time_collisions(game, calls):
+    # check_collisions with the chicken landed on each lane type in turn. The
+    # call is about as cheap as the loop around it, so the same loop without
+    # the call is timed too and taken off.
+    player = game.player
+    base = player.grid_y
+    elapsed = []
+    for check in (game.check_collisions, lambda: None):
+        start = time.perf_counter()
+        for call in range(calls):
+            player.grid_y = base + call % len(SUITE_LANE_TYPES)
+            player.on_log = False
+            player.current_log = None
+            check()
+            keep_alive(game)
+        elapsed.append(time.perf_counter() - start)
+    player.grid_y = base
+    return max(0.0, elapsed[0] - elapsed[1]) / calls
+
+
+def time_draws_updating(game, frames):
+    # Game.draw alone, with an (untimed) update between draws
+    elapsed = 0.0
+    for _ in range(frames):
+        game.update()
+        keep_alive(game)
+        start = time.perf_counter()
+        game.draw()
+        elapsed += time.perf_counter() - start
+    return elapsed / frames
+
+
+def time_generation(game, lanes):
+    # Game.generate_lanes, per lane, scrolling the window forward one lane
+    # at a time (and evicting behind it, as update does) until `lanes` lanes
+    # have been generated. A chunk being built in the background is given
+    # the time to finish that the frames between lanes would give it, so
+    # this is the cost the main loop sees.
+    elapsed = 0.0
+    generated = 0
+    while generated < lanes:
+        pending = game.generator.pending
+        if isinstance(pending, concurrent.futures.Future):
+            pending.result()
+        game.camera_y += 1
+        before = len(game.lanes)
+        start = time.perf_counter()
+        game.generate_lanes()
+        if len(game.lanes) > before:  # Big windows only need lanes now and then
+            elapsed += time.perf_counter() - start
+            generated += len(game.lanes) - before
+        for lane in game.lanes.evict_below(int(game.camera_y) - main.LANE_KEEP_BEHIND):
+            game.pool.release(lane)
+    return elapsed / generated
+
+
+def suite_results(args):
+    repeats = args.repeats or SUITE_REPEATS
+    results = {}
+    for name, size in SUITE_WORLDS.items():
+        game = sized_world(args.seed, *size)
+        time_frames(game, 30)
+        game.draw()
+        results[f"{name}/update"] = median_of(repeats, lambda: time_frames(game, args.frames))
+        results[f"{name}/check_collisions"] = median_of(
+            repeats, lambda: time_collisions(game, args.frames * 50))
+        results[f"{name}/draw"] = median_of(
+            repeats, lambda: time_draws_updating(game, max(1, args.frames // 10)))
+        results[f"{name}/generate_lanes"] = median_of(
+            repeats, lambda: time_generation(sized_world(args.seed, *size), 300))
+    return results
+
+
+def bench_suite(args):
+    # Time the hot paths in worlds of controlled size, then save them as the
+    # baseline (--save-baseline) or fail if any is over --threshold slower
+    # (and over SUITE_NOISE_FLOOR) slower than the baseline
+    baseline = None
+    if not args.save_baseline:
+        if not os.path.exists(args.baseline):
+            raise SystemExit(f"no baseline at {args.baseline}; "
+                             f"record one with --save-baseline")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results = suite_results(args)
+    machine = {"python": platform.python_version(), "pygame": pygame.version.ver,
+               "machine": platform.machine(), "processor": platform.processor()}
+    if baseline is not None and baseline["machine"] != machine:
+        print(f"warning: baseline was recorded on {baseline['machine']}")
+    regressions = []
+    print(f"{'hot path':>24} {'us':>9} {'baseline':>9} {'change':>8}")
+    for key, seconds in results.items():
+        line = f"{key:>24} {seconds * 1e6:>9.2f}"
+        if baseline is not None and key in baseline["results"]:
+            before = baseline["results"][key]
+            change = seconds / before - 1
+            line += f" {before * 1e6:>9.2f} {change:>+8.1%}"
+            if change > args.threshold and seconds - before > SUITE_NOISE_FLOOR:
+                regressions.append(key)
+                line += "  REGRESSED"
+        print(line)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": machine, "seed": args.seed, "frames": args.frames,
+                       "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+    if regressions:
+        raise SystemExit(f"{len(regressions)} hot path(s) regressed more than "
+                         f"{args.threshold:.0%}: {', '.join(regressions)}")
+
+
+BENCHMARKS = {
+    "band": bench_band,
+    "draw": bench_draw,
+    "engine": bench_engine,
+    "hud": bench_hud,
+    "input": bench_input,
+    "lanes": bench_lanes,
+    "quality": bench_quality,
+    "rivers": bench_rivers,
+    "rl": bench_rl,
+    "snapshot": bench_snapshot,
+    "soak": bench_soak,
+    "startup": bench_startup,
+    "suite": bench_suite,
+}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--distances", type=int, nargs="+",
+                        default=[0, 100, 1000, 10000, 20000])
+    parser.add_argument("--seeds", type=int, default=300, help="rivers: worlds generated")
+    parser.add_argument("--minutes", type=float, default=30, help="soak: session length")
+    parser.add_argument("--long-frame", type=float, default=1.0,
+                        help="soak: frame time in ms counted as a long frame")
+    parser.add_argument("--repeats", type=int,
+                        help=f"suite/startup: runs per measurement, keeping the median"
+                             f" (suite, default {SUITE_REPEATS}) or fastest (startup,"
+                             f" default {STARTUP_REPEATS})")
+    parser.add_argument("--baseline", default=SUITE_BASELINE, help="suite: baseline file")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="suite: record this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="suite: slowdown over the baseline that fails, as a fraction")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,9 +1,27 @@
+import time
+
+STARTED = time.perf_counter()  # For the startup report (see Game.startup)
+
+import argparse
+import collections
+import concurrent.futures
+import gc
+import heapq
+import json
+import math
+import os
 import pygame
 import random
+import struct
 import sys
 
-# Initialize Pygame
-pygame.init()
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for the optional "numpy" entity engine
+    np = None
+
+# pygame is started piecemeal: init_display() for a window, load_font() for
+# text, and nothing at all for headless games
 
 # Constants
 SCREEN_WIDTH = 800
@@ -25,9 +43,146 @@ DARK_GREEN = (0, 100, 0)
 LIGHT_BLUE = (135, 206, 250)
 
 # Game settings
-FPS = 60
+FPS = 60  # Simulation steps per second; everything below is counted in steps
+SIM_DT = 1.0 / FPS
+MAX_CATCH_UP_STEPS = 5  # Steps run per rendered frame before dropping lost time
+
+# Difficulty and balance; a Tuning bundles them so runs can override any knob
+DIFFICULTY_STEP = 200          # Score per difficulty step
+DIFFICULTY_GAIN = 0.2          # Extra lane speed per difficulty step
+SPEED_JITTER = (0.7, 1.3)      # Random per-lane speed factor range
+GRASS_AFTER_HAZARD = 0.6       # Chance of forcing grass after a river/train lane
+TRAIN_WARNING_CHANCE = 0.01    # Per-step chance a train not running starts (or restarts) its warning
 INITIAL_VEHICLE_SPEED = 0.08
 INITIAL_LOG_SPEED = 0.06
+VEHICLE_TOP = TILE_SIZE * 0.15  # Entity offsets from the top of their lane
+LOG_TOP = TILE_SIZE * 0.2
+TRAIN_TOP = TILE_SIZE * 0.1
+LANE_KEEP_BEHIND = 3  # Lanes kept below the camera (the draw margin is 2)
+CHUNK_LANES = 8  # Lanes generated together, from one seed (see LaneGenerator)
+LANE_ATTEMPTS = 8  # Draws of a lane that fails reach_after before open grass is used
+START_COLUMN = GRID_WIDTH // 2
+# Lanes simulated every step, as (behind, ahead) of the camera; the rest lie
+# dormant and are caught up in closed form when they come back into range
+ACTIVE_BAND = (LANE_KEEP_BEHIND, GRID_HEIGHT + 2)
+
+# Lane occupancy is kept as bitmasks over the GRID_WIDTH columns (bit c is
+# column c); Game.tile_state combines them into these flags
+FULL_ROW = (1 << GRID_WIDTH) - 1
+TILE_BLOCKED = 1   # A tree, or off the board
+TILE_DEADLY = 2    # A vehicle, a train, or open water
+TILE_PLATFORM = 4  # A log to stand on
+
+# Player actions as (dx, dy) grid moves; "none" leaves the chicken where it is
+ACTIONS = {
+    "up": (0, 1),
+    "left": (-1, 0),
+    "right": (1, 0),
+    "none": None,
+}
+
+# Compact codes for recorded actions
+ACTION_CODES = {"none": 0, "up": 1, "left": 2, "right": 3}
+CODE_ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+
+KEY_ACTIONS = {
+    pygame.K_UP: "up",
+    pygame.K_w: "up",
+    pygame.K_LEFT: "left",
+    pygame.K_a: "left",
+    pygame.K_RIGHT: "right",
+    pygame.K_d: "right",
+}
+REWIND_KEYS = (pygame.K_r, pygame.K_BACKSPACE)
+REWIND_INTERVAL = FPS // 2  # Frames between rewind snapshots while playing
+REWIND_SNAPSHOTS = 20       # Snapshots kept, so up to 10 seconds of rewind
+INPUT_BUFFER = 2     # Moves pressed mid-hop held for when the chicken lands
+INPUT_POLL = 0.002   # Seconds between input reads while waiting for the next frame
+LATENCY_SAMPLES = 500  # Key-to-motion latencies kept for InputQueue.percentiles
+WARM_UP_SLACK = 0.004  # Seconds of idle frame time needed to run a warm-up task
+# Render quality levels, each dropping one more thing than the one before:
+# decorations (road lines, log texture, train windows), then the windows
+# that make vehicles more than plain rects, then the lanes drawn past the
+# screen edges, then the eagle shadow's full-screen blend. Game.quality
+# holds the level; see QualityGovernor.
+QUALITY_FULL, QUALITY_NO_DECORATIONS, QUALITY_PLAIN, QUALITY_TIGHT, QUALITY_NO_SHADOW = range(5)
+QUALITY_NAMES = ("full", "no decorations", "plain vehicles", "tight margin", "no shadow")
+QUALITY_SMOOTHING = 0.1  # Weight of the latest frame in the frame time average
+QUALITY_DROP = 0.9       # Share of the frame budget the average must pass to drop a level
+QUALITY_RAISE = 0.6      # Share it must stay under to raise one back
+QUALITY_HOLD = FPS // 2  # Frames over QUALITY_DROP before a level is dropped
+QUALITY_RECOVER = 2 * FPS  # Frames under QUALITY_RAISE before a level is raised
+QUALITY_RECOVER_MAX = 30 * FPS  # Cap on QUALITY_RECOVER's doubling (see QualityGovernor)
+
+def columns_between(start, end, closed=True):
+    # Bitmask of the on-board columns c with start <= c <= end (c < end
+    # when not closed); the same tests the collision checks apply to grid_x
+    low = max(math.ceil(start), 0)
+    high = min(math.floor(end) if closed else math.ceil(end) - 1, GRID_WIDTH - 1)
+    if low > high:
+        return 0
+    return (1 << (high + 1)) - (1 << low)
+
+
+def position_after(x, speed, direction, wrap, steps):
+    # Where x lands after `steps` updates of x += speed * direction that jump
+    # to `wrap` before the near edge once more than `wrap` past the far one
+    # (Vehicle/Log.update), without stepping; exact up to float rounding.
+    # Worked in travel coordinates u = x * direction, which always increase.
+    u = x * direction
+    limit = GRID_WIDTH + wrap if direction > 0 else wrap
+    reset = -wrap if direction > 0 else -(GRID_WIDTH + wrap)
+    first = int((limit - u) // speed) + 1  # Steps to the first wrap
+    if steps < first:
+        return x + steps * speed * direction
+    period = int((limit - reset) // speed) + 1  # Steps from one wrap to the next
+    return (reset + ((steps - first) % period) * speed) * direction
+
+
+def train_state_after(x, speed, direction, length, active, warning_timer, steps):
+    # Train.update's warning-then-active timeline, `steps` updates ahead
+    velocity = speed * direction
+    end = GRID_WIDTH + 5 if direction > 0 else 5  # Travel coordinate where it switches off
+    if warning_timer > 0:
+        if steps < warning_timer:
+            return False, x, warning_timer - steps
+        steps -= warning_timer - 1  # It moves on the step it is released
+        x = -length if direction > 0 else GRID_WIDTH + length
+    elif not active:
+        return False, x, 0
+    gone = int((end - x * direction) // speed) + 1  # Steps until it switches off
+    if steps >= gone:
+        return False, x + gone * velocity, 0
+    return True, x + steps * velocity, 0
+
+
+def geometric_steps(rng, chance):
+    # Steps (1 or more) until an event with this per-step chance first
+    # happens, drawn in one go; None if it never can
+    if chance <= 0:
+        return None
+    if chance >= 1:
+        return 1
+    return int(math.log(1.0 - rng.random()) / math.log(1.0 - chance)) + 1
+
+
+class Tuning:
+    # Balance knobs for a Game; the defaults are the shipped balance
+    def __init__(self, difficulty_step=DIFFICULTY_STEP, difficulty_gain=DIFFICULTY_GAIN,
+                 speed_jitter=SPEED_JITTER, grass_after_hazard=GRASS_AFTER_HAZARD,
+                 train_warning_chance=TRAIN_WARNING_CHANCE):
+        self.difficulty_step = difficulty_step
+        self.difficulty_gain = difficulty_gain
+        self.speed_jitter = tuple(speed_jitter)
+        self.grass_after_hazard = grass_after_hazard
+        self.train_warning_chance = train_warning_chance
+    
+    def as_dict(self):
+        return dict(vars(self))
+    
+    def difficulty(self, score):
+        return 1 + (score / self.difficulty_step) * self.difficulty_gain
+
 
 class Player:
     def __init__(self, x, y):
@@ -44,6 +199,8 @@ class Player:
         self.current_log = None
         self.idle_timer = 0  # Track how long player has been idle
         self.max_idle_time = 300  # 5 seconds at 60 FPS
+        self.prev_x = x  # Position one step ago, for interpolated rendering
+        self.prev_y = y
         
     def move(self, dx, dy, lanes):
         if self.moving:
@@ -66,7 +223,7 @@ class Player:
             if lane_index < len(lanes):
                 lane = lanes[lane_index]
                 # Check if there's a tree/obstacle at the target position
-                if lane.type == "grass" and lane.has_obstacle_at(int(round(new_x))):
+                if lane.has_obstacle_at(int(round(new_x))):
                     return
         
         # If moving forward (dy > 0), clear log riding
@@ -83,6 +240,8 @@ class Player:
         self.move_progress = 0
     
     def update(self):
+        self.prev_x = self.x
+        self.prev_y = self.y
         if self.moving:
             self.move_progress += 0.2
             if self.move_progress >= 1.0:
@@ -96,14 +255,27 @@ class Player:
                 self.x = self.grid_x + (self.target_x - self.grid_x) * self.move_progress
                 self.y = self.grid_y + (self.target_y - self.grid_y) * self.move_progress
     
-    def draw(self, screen, camera_y):
+    def draw(self, screen, camera_y, sprites=None, dirty=None, lag=0.0):
+        # lag: how far (in steps) the rendered frame trails the simulation
+        x = self.x - (self.x - self.prev_x) * lag
+        y = self.y - (self.y - self.prev_y) * lag
         # Invert Y coordinate - higher grid_y should be higher on screen
-        screen_y = (camera_y + GRID_HEIGHT - 1 - self.y) * TILE_SIZE
-        screen_x = self.x * TILE_SIZE
+        screen_y = (camera_y + GRID_HEIGHT - 1 - y) * TILE_SIZE
+        screen_x = x * TILE_SIZE
         
-        # Draw chicken body (yellow circle)
         center_x = int(screen_x + TILE_SIZE // 2)
         center_y = int(screen_y + TILE_SIZE // 2)
+        left = center_x - TILE_SIZE // 2
+        top = center_y - TILE_SIZE // 2
+        if sprites is not None:
+            screen.blit(sprites.player(self), (left, top))
+        else:
+            self.paint(screen, center_x, center_y)
+        if dirty is not None:
+            dirty.append(pygame.Rect(left, top, TILE_SIZE, TILE_SIZE))
+    
+    def paint(self, screen, center_x, center_y):
+        # Draw chicken body (yellow circle)
         pygame.draw.circle(screen, YELLOW, (center_x, center_y), TILE_SIZE // 3)
         
         # Draw beak (small orange triangle)
@@ -119,6 +291,8 @@ class Player:
 
 
 class Vehicle:
+    __slots__ = ("x", "y", "speed", "direction", "type", "width")
+    
     def __init__(self, x, y, speed, direction, vehicle_type="car"):
         self.x = x
         self.y = y
@@ -136,22 +310,44 @@ class Vehicle:
         elif self.direction < 0 and self.x < -2:
             self.x = GRID_WIDTH + 2
     
-    def draw(self, screen, camera_y):
+    def draw(self, screen, camera_y, sprites=None, dirty=None, lag=0.0, quality=QUALITY_FULL):
         # Invert Y coordinate
         screen_y = (camera_y + GRID_HEIGHT - 1 - self.y) * TILE_SIZE
-        screen_x = self.x * TILE_SIZE
+        screen_x = (self.x - self.speed * self.direction * lag) * TILE_SIZE
         
+        windows = quality < QUALITY_PLAIN
+        if sprites is not None:
+            rect = screen.blit(sprites.vehicle(self, windows), (int(screen_x), int(screen_y + VEHICLE_TOP)))
+        else:
+            rect = self.paint(screen, screen_x, screen_y, windows)
+        if dirty is not None:
+            dirty.append(rect)
+    
+    def paint(self, screen, screen_x, screen_y, windows=True):
         width = int(self.width * TILE_SIZE)
         height = int(TILE_SIZE * 0.7)
         
         color = RED if self.type == "car" else GRAY
-        pygame.draw.rect(screen, color, (int(screen_x), int(screen_y + TILE_SIZE * 0.15), width, height))
+        body = pygame.draw.rect(screen, color, (int(screen_x), int(screen_y + VEHICLE_TOP), width, height))
         
         # Windows
-        window_color = LIGHT_BLUE
-        pygame.draw.rect(screen, window_color, 
-                        (int(screen_x + width * 0.2), int(screen_y + TILE_SIZE * 0.25), 
-                         int(width * 0.3), int(height * 0.4)))
+        if windows:
+            window_color = LIGHT_BLUE
+            pygame.draw.rect(screen, window_color, 
+                            (int(screen_x + width * 0.2), int(screen_y + TILE_SIZE * 0.25), 
+                             int(width * 0.3), int(height * 0.4)))
+        return body
+    
+    def columns(self):
+        # Columns where collides_with would hit a player
+        return columns_between(self.x, self.x + self.width)
+    
+    def position_after(self, steps):
+        return position_after(self.x, self.speed, self.direction, 2, steps)
+    
+    def columns_after(self, steps):
+        x = self.position_after(steps)
+        return columns_between(x, x + self.width)
     
     def collides_with(self, player):
         # Check if player overlaps with vehicle
@@ -165,6 +361,8 @@ class Vehicle:
 
 
 class Log:
+    __slots__ = ("x", "y", "speed", "direction", "length")
+    
     def __init__(self, x, y, speed, direction, length=2):
         self.x = x
         self.y = y
@@ -181,23 +379,47 @@ class Log:
         elif self.direction < 0 and self.x < -self.length:
             self.x = GRID_WIDTH + self.length
     
-    def draw(self, screen, camera_y):
+    def draw(self, screen, camera_y, sprites=None, dirty=None, lag=0.0, quality=QUALITY_FULL):
         # Invert Y coordinate
         screen_y = (camera_y + GRID_HEIGHT - 1 - self.y) * TILE_SIZE
-        screen_x = self.x * TILE_SIZE
+        screen_x = (self.x - self.speed * self.direction * lag) * TILE_SIZE
         
+        decorations = quality < QUALITY_NO_DECORATIONS
+        if sprites is not None:
+            rect = screen.blit(sprites.log(self, decorations), (int(screen_x), int(screen_y + LOG_TOP)))
+        else:
+            rect = self.paint(screen, screen_x, screen_y, decorations)
+        if dirty is not None:
+            dirty.append(rect)
+    
+    def paint(self, screen, screen_x, screen_y, decorations=True):
         width = int(self.length * TILE_SIZE)
         height = int(TILE_SIZE * 0.6)
         
-        pygame.draw.rect(screen, BROWN, 
-                        (int(screen_x), int(screen_y + TILE_SIZE * 0.2), width, height))
+        body = pygame.draw.rect(screen, BROWN, 
+                               (int(screen_x), int(screen_y + LOG_TOP), width, height))
+        if not decorations:
+            return body
         
         # Log texture lines
         for i in range(int(self.length)):
             line_x = int(screen_x + i * TILE_SIZE + TILE_SIZE // 2)
             pygame.draw.line(screen, (100, 50, 0), 
-                           (line_x, int(screen_y + TILE_SIZE * 0.2)), 
+                           (line_x, int(screen_y + LOG_TOP)), 
                            (line_x, int(screen_y + TILE_SIZE * 0.8)), 2)
+        # The texture lines end a pixel below the body
+        return body.inflate(0, 2)
+    
+    def columns(self):
+        # Columns where is_player_on holds
+        return columns_between(self.x, self.x + self.length, closed=False)
+    
+    def position_after(self, steps):
+        return position_after(self.x, self.speed, self.direction, self.length, steps)
+    
+    def columns_after(self, steps):
+        x = self.position_after(steps)
+        return columns_between(x, x + self.length, closed=False)
     
     def is_player_on(self, player):
         px = player.grid_x
@@ -210,6 +432,9 @@ class Log:
 
 
 class Train:
+    __slots__ = ("y", "direction", "active", "x", "warning_timer", "warning_duration",
+                 "speed", "length")
+    
     def __init__(self, y, direction):
         self.y = y
         self.direction = direction
@@ -239,28 +464,69 @@ class Train:
                (self.direction < 0 and self.x < -5):
                 self.active = False
     
-    def draw(self, screen, camera_y):
+    def draw(self, screen, camera_y, sprites=None, dirty=None, lag=0.0, quality=QUALITY_FULL):
         # Invert Y coordinate
         screen_y = (camera_y + GRID_HEIGHT - 1 - self.y) * TILE_SIZE
         
         if self.warning_timer > 0:
             # Flash warning
             if self.warning_timer % 20 < 10:
-                pygame.draw.rect(screen, RED, (0, int(screen_y), SCREEN_WIDTH, TILE_SIZE), 3)
+                rect = pygame.draw.rect(screen, RED, (0, int(screen_y), SCREEN_WIDTH, TILE_SIZE), 3)
+                if dirty is not None:
+                    dirty.append(rect)
         
         if self.active:
-            screen_x = self.x * TILE_SIZE
-            width = int(self.length * TILE_SIZE)
-            height = int(TILE_SIZE * 0.8)
-            
-            pygame.draw.rect(screen, DARK_GREEN, 
-                           (int(screen_x), int(screen_y + TILE_SIZE * 0.1), width, height))
-            
-            # Train windows
+            screen_x = (self.x - self.speed * self.direction * lag) * TILE_SIZE
+            decorations = quality < QUALITY_NO_DECORATIONS
+            if sprites is not None:
+                rect = screen.blit(sprites.train(self, decorations), (int(screen_x), int(screen_y + TRAIN_TOP)))
+            else:
+                rect = self.paint(screen, screen_x, screen_y, decorations)
+            if dirty is not None:
+                dirty.append(rect)
+    
+    def paint(self, screen, screen_x, screen_y, decorations=True):
+        width = int(self.length * TILE_SIZE)
+        height = int(TILE_SIZE * 0.8)
+        
+        body = pygame.draw.rect(screen, DARK_GREEN, 
+                              (int(screen_x), int(screen_y + TRAIN_TOP), width, height))
+        
+        # Train windows
+        if decorations:
             for i in range(self.length):
                 window_x = int(screen_x + i * TILE_SIZE + 10)
                 pygame.draw.rect(screen, YELLOW, 
                                (window_x, int(screen_y + TILE_SIZE * 0.3), 20, 15))
+        return body
+    
+    def columns(self):
+        # Columns where collides_with would hit a player
+        if not self.active:
+            return 0
+        return columns_between(self.x, self.x + self.length, closed=False)
+    
+    def state_after(self, steps):
+        # (active, x, warning_timer) after `steps` updates, if no warning
+        # starts or starts over in between. Neither can be foreseen. A new
+        # warning cannot put a train on the track sooner than
+        # warning_duration steps, so for a train that is idle or running
+        # this is exact (up to float rounding) for steps <= warning_duration.
+        # A warning that starts over only delays its train: for a train
+        # mid-warning, active and x are exact for steps < warning_timer, and
+        # past that the train may come (and go) later than shown.
+        return train_state_after(self.x, self.speed, self.direction, self.length,
+                                 self.active, self.warning_timer, steps)
+    
+    def run_steps(self):
+        # Steps from a warning on an idle train until it is idle again
+        return self.warning_duration - 1 + int((GRID_WIDTH + 5 + self.length) // self.speed) + 1
+    
+    def columns_after(self, steps):
+        active, x, _ = self.state_after(steps)
+        if not active:
+            return 0
+        return columns_between(x, x + self.length, closed=False)
     
     def collides_with(self, player):
         if not self.active:
@@ -276,7 +542,14 @@ class Train:
 
 
 class Lane:
-    def __init__(self, y, lane_type, direction=1, speed=1.5):
+    __slots__ = ("rng", "pool", "y", "type", "direction", "speed", "vehicles", "logs", "train",
+                 "obstacles", "blocked", "occupancy", "frame", "layout")
+    
+    def __init__(self, y, lane_type, direction=1, speed=1.5, rng=random, pool=None):
+        # rng: the game's random.Random, so a seed reproduces the lane
+        # pool: an EntityPool to take recycled entities from
+        self.rng = rng
+        self.pool = pool
         self.y = y
         self.type = lane_type
         self.direction = direction
@@ -285,43 +558,83 @@ class Lane:
         self.logs = []
         self.train = None
         self.obstacles = []
+        # Occupancy bitmasks: trees never move; the deadly/platform pair is
+        # rebuilt from the entities at most once per step, on first use
+        self.blocked = 0
+        self.occupancy = None
+        self.frame = 0  # Game frame the entities were last brought up to
+        self.layout = None  # Built by snapshot()
         
         if lane_type == "road":
             self.spawn_vehicles()
         elif lane_type == "river":
             self.spawn_logs()
         elif lane_type == "train":
-            self.train = Train(y, direction)
+            self.train = self.new(Train, y, direction)
         elif lane_type == "grass":
             self.spawn_obstacles()
     
+    def new(self, cls, *args):
+        if self.pool is not None:
+            return self.pool.make(cls, *args)
+        return cls(*args)
+    
     def spawn_vehicles(self):
-        num_vehicles = random.randint(2, 4)
+        num_vehicles = self.rng.randint(2, 4)
         spacing = GRID_WIDTH / num_vehicles
         
         for i in range(num_vehicles):
-            x = i * spacing + random.uniform(-spacing * 0.3, spacing * 0.3)
-            vehicle_type = random.choice(["car", "car", "truck"])
-            self.vehicles.append(Vehicle(x, self.y, self.speed, self.direction, vehicle_type))
+            x = i * spacing + self.rng.uniform(-spacing * 0.3, spacing * 0.3)
+            vehicle_type = self.rng.choice(["car", "car", "truck"])
+            self.vehicles.append(self.new(Vehicle, x, self.y, self.speed, self.direction, vehicle_type))
     
     def spawn_logs(self):
-        num_logs = random.randint(2, 3)
+        num_logs = self.rng.randint(2, 3)
         spacing = GRID_WIDTH / num_logs
         
         for i in range(num_logs):
-            x = i * spacing + random.uniform(-spacing * 0.3, spacing * 0.3)
-            length = random.randint(2, 3)
-            self.logs.append(Log(x, self.y, self.speed, self.direction, length))
+            x = i * spacing + self.rng.uniform(-spacing * 0.3, spacing * 0.3)
+            length = self.rng.randint(2, 3)
+            self.logs.append(self.new(Log, x, self.y, self.speed, self.direction, length))
     
     def spawn_obstacles(self):
         # Randomly place trees/rocks
-        num_obstacles = random.randint(0, 3)
+        num_obstacles = self.rng.randint(0, 3)
         for _ in range(num_obstacles):
-            x = random.randint(0, GRID_WIDTH - 1)
+            x = self.rng.randint(0, GRID_WIDTH - 1)
             self.obstacles.append(x)
+            self.blocked |= 1 << x
     
     def has_obstacle_at(self, x):
-        return x in self.obstacles
+        return 0 <= x < GRID_WIDTH and self.blocked >> x & 1 == 1
+    
+    def masks(self):
+        # (blocked, deadly, platform) column bitmasks for this step
+        if self.occupancy is None:
+            deadly = platform = 0
+            for vehicle in self.vehicles:
+                deadly |= vehicle.columns()
+            for log in self.logs:
+                platform |= log.columns()
+            if self.type == "river":
+                deadly |= FULL_ROW & ~platform
+            if self.train:
+                deadly |= self.train.columns()
+            self.occupancy = (self.blocked, deadly, platform)
+        return self.occupancy
+    
+    def masks_after(self, steps):
+        # masks() as they will be `steps` updates from now (see Train.state_after)
+        deadly = platform = 0
+        for vehicle in self.vehicles:
+            deadly |= vehicle.columns_after(steps)
+        for log in self.logs:
+            platform |= log.columns_after(steps)
+        if self.type == "river":
+            deadly |= FULL_ROW & ~platform
+        if self.train:
+            deadly |= self.train.columns_after(steps)
+        return self.blocked, deadly, platform
     
     def update(self):
         for vehicle in self.vehicles:
@@ -330,11 +643,66 @@ class Lane:
             log.update()
         if self.train:
             self.train.update()
+        self.occupancy = None
+    
+    def catch_up(self, steps):
+        # Jump a dormant lane `steps` updates ahead in closed form
+        for vehicle in self.vehicles:
+            vehicle.x = vehicle.position_after(steps)
+        for log in self.logs:
+            log.x = log.position_after(steps)
+        if self.train:
+            train = self.train
+            train.active, train.x, train.warning_timer = train.state_after(steps)
+        self.occupancy = None
     
-    def draw(self, screen, camera_y):
+    def snapshot(self):
+        # (layout, frame, entity positions, train state) as plain values.
+        # The layout - everything fixed when the lane was made - is built
+        # once and shared by every snapshot of the lane; a lane whose
+        # layout is the snapshot's very tuple only needs its positions reset.
+        if self.layout is None:
+            self.layout = (self.y, self.type, self.direction, self.speed, tuple(self.obstacles),
+                           tuple([vehicle.type for vehicle in self.vehicles]),
+                           tuple([log.length for log in self.logs]), self.train is not None)
+        train = self.train
+        return (self.layout, self.frame, tuple([entity.x for entity in self.vehicles or self.logs]),
+                (train.active, train.x, train.warning_timer) if train else None)
+    
+    def restore(self, state):
+        # Fill a lane made with lane_type=None (which spawns nothing and
+        # draws nothing from the rng) from a snapshot() tuple
+        layout, _, positions, _ = state
+        y, self.type, direction, speed, obstacles, vehicle_types, log_lengths, train = layout
+        for x in obstacles:
+            self.obstacles.append(x)
+            self.blocked |= 1 << x
+        for x, vehicle_type in zip(positions, vehicle_types):
+            self.vehicles.append(self.new(Vehicle, x, y, speed, direction, vehicle_type))
+        for x, length in zip(positions, log_lengths):
+            self.logs.append(self.new(Log, x, y, speed, direction, length))
+        if train:
+            self.train = self.new(Train, y, direction)
+        self.layout = layout
+        self.reload(state)
+    
+    def reload(self, state):
+        # Reset the moving parts of a lane with the snapshot's layout
+        _, self.frame, positions, train = state
+        for entity, x in zip(self.vehicles or self.logs, positions):
+            entity.x = x
+        if train is not None:
+            self.train.active, self.train.x, self.train.warning_timer = train
+        self.occupancy = None
+    
+    def draw(self, screen, camera_y, sprites=None, dirty=None, lag=0.0, quality=QUALITY_FULL):
         # Invert Y coordinate
         screen_y = (camera_y + GRID_HEIGHT - 1 - self.y) * TILE_SIZE
-        
+        self.draw_background(screen, screen_y, sprites, quality)
+        self.draw_entities(screen, camera_y, sprites, dirty, lag, quality)
+    
+    def draw_background(self, screen, screen_y, sprites=None, quality=QUALITY_FULL):
+        # Everything about a lane that never moves: ground, road lines, trees
         # Draw lane background
         if self.type == "grass":
             color = GREEN
@@ -350,7 +718,7 @@ class Lane:
         pygame.draw.rect(screen, color, (0, int(screen_y), SCREEN_WIDTH, TILE_SIZE))
         
         # Draw lane decorations
-        if self.type == "road":
+        if self.type == "road" and quality < QUALITY_NO_DECORATIONS:
             # Draw road lines
             dash_width = 20
             dash_spacing = 40
@@ -361,63 +729,1359 @@ class Lane:
             # Draw obstacles (trees)
             for obs_x in self.obstacles:
                 obs_screen_x = obs_x * TILE_SIZE + TILE_SIZE // 2
-                pygame.draw.circle(screen, DARK_GREEN, 
-                                 (int(obs_screen_x), int(screen_y + TILE_SIZE // 2)), 
-                                 TILE_SIZE // 3)
-        
-        # Draw entities
+                if sprites is not None:
+                    screen.blit(sprites.tree(), (obs_x * TILE_SIZE, int(screen_y + TILE_SIZE // 2) - TILE_SIZE // 2))
+                else:
+                    paint_tree(screen, int(obs_screen_x), int(screen_y + TILE_SIZE // 2))
+    
+    def draw_entities(self, screen, camera_y, sprites=None, dirty=None, lag=0.0, quality=QUALITY_FULL):
         for vehicle in self.vehicles:
-            vehicle.draw(screen, camera_y)
+            vehicle.draw(screen, camera_y, sprites, dirty, lag, quality)
         for log in self.logs:
-            log.draw(screen, camera_y)
+            log.draw(screen, camera_y, sprites, dirty, lag, quality)
         if self.train:
-            self.train.draw(screen, camera_y)
+            self.train.draw(screen, camera_y, sprites, dirty, lag, quality)
 
 
-class Game:
+def largest_gap(logs):
+    # The longest stretch of a river lane's cycle (GRID_WIDTH plus the
+    # distance logs travel off the board either side) with no log on it
+    cycle = GRID_WIDTH + 2 * max(log.length for log in logs)
+    spans = sorted((log.x * log.direction, log.length) for log in logs)
+    gap = spans[0][0] + cycle - (spans[-1][0] + spans[-1][1])
+    for (start, length), (following, _) in zip(spans, spans[1:]):
+        gap = max(gap, following - (start + length))
+    return gap
+
+
+def river_gap(lane):
+    # The largest gap between the lane's logs at any point of its cycle.
+    # Logs of one length wrap on the same lap, so they keep their spacing
+    # apart from their first wrap, which can move one by up to a step.
+    # Logs of different lengths lap at different rates and drift into any
+    # arrangement, down to all lying together: then only the longest log
+    # is sure to break up the cycle.
+    longest = max(log.length for log in lane.logs)
+    if all(log.length == longest for log in lane.logs):
+        return largest_gap(lane.logs) + lane.speed
+    return GRID_WIDTH + longest
+
+
+def reach_after(lane, reach):
+    # Incremental feasibility check for generation. reach describes the
+    # lane below: (columns the chicken can hop up from, the log velocity it
+    # drifts at there or None on solid ground). Returns the same for
+    # `lane`, or None when no way across can be guaranteed:
+    # - grass: land on a column free of trees, then walk along it
+    # - road, train: traffic passes, so hop straight on
+    # - river from solid ground: wait for a log (every log passes every
+    #   column), then ride it to the edge
+    # - river from river: the chicken cannot wait, so logs above must pass
+    #   under it while its own log carries it across, whatever the two
+    #   lanes' phase: the distance they move apart over that ride has to
+    #   cover the largest gap between logs above (see river_gap)
+    columns, velocity = reach
+    if lane.type == "grass":
+        free = FULL_ROW & ~lane.blocked
+        reached = columns & free
+        if not reached:
+            return None
+        while True:
+            spread = (reached | reached << 1 | reached >> 1) & free
+            if spread == reached:
+                return reached, None
+            reached = spread
+    if lane.type != "river":
+        return columns, None
+    log_velocity = lane.speed * lane.direction
+    if velocity is not None:
+        ride = (columns.bit_length() - (columns & -columns).bit_length() + 1) / abs(velocity)
+        if abs(velocity - log_velocity) * ride < river_gap(lane):
+            return None
+    # Carried from the first column it can board at to the far edge
+    if lane.direction > 0:
+        return FULL_ROW & ~((columns & -columns) - 1), log_velocity
+    return (1 << columns.bit_length()) - 1, log_velocity
+
+
+def generate_chunk(seed, index, score, previous, tuning, pool=None):
+    # The lanes of chunk `index` (lanes index * CHUNK_LANES on) of the world
+    # `seed`, at the difficulty for `score`, and the (type, reach_after)
+    # of its last lane. previous is that pair for the lane before the
+    # chunk, None to start from the chicken's column (or, past chunk 0,
+    # from anywhere). A lane that fails reach_after is drawn again, up to
+    # LANE_ATTEMPTS times, then replaced by open grass. Only depends on its
+    # arguments, so it can run on any thread.
+    rng = random.Random(seed << 32 | index)
+    lane_types = ["grass", "road", "river", "train", "grass"]
+    difficulty_multiplier = tuning.difficulty(score)
+    if previous is None:
+        previous = (None, (1 << START_COLUMN if index == 0 else FULL_ROW, None))
+    previous_type, reach = previous
+    lanes = []
+    for y in range(index * CHUNK_LANES, (index + 1) * CHUNK_LANES):
+        for _ in range(LANE_ATTEMPTS):
+            if y < 2:
+                lane_type = "grass"
+            else:
+                lane_type = rng.choice(lane_types)
+                
+                # Don't put hazards right next to each other too often
+                if previous_type in ["river", "train"]:
+                    if rng.random() < tuning.grass_after_hazard:
+                        lane_type = "grass"
+            
+            direction = rng.choice([1, -1])
+            
+            # Progressive difficulty
+            base_speed = INITIAL_VEHICLE_SPEED if lane_type == "road" else INITIAL_LOG_SPEED
+            speed = base_speed * rng.uniform(*tuning.speed_jitter) * difficulty_multiplier
+            
+            if pool is not None:
+                lane = pool.make(Lane, y, lane_type, direction, speed, rng, pool)
+            else:
+                lane = Lane(y, lane_type, direction, speed, rng)
+            lane_reach = reach_after(lane, reach)
+            if lane_reach is not None:
+                break
+            if pool is not None:
+                pool.release(lane)
+        else:
+            # Open grass: a lane made with no type spawns nothing
+            lane = pool.make(Lane, y, None, 1, 0.0, rng, pool) if pool is not None \
+                else Lane(y, None, 1, 0.0, rng)
+            lane.type = lane_type = "grass"
+            lane_reach = reach_after(lane, reach)
+        lanes.append(lane)
+        previous_type, reach = lane_type, lane_reach
+    return lanes, (previous_type, reach)
+
+
+class LaneGenerator:
+    # Hands out a world's lanes in order, generating them a chunk at a
+    # time. Each chunk is requested - with the score of that moment setting
+    # its difficulty - as soon as the chunk before it starts being used, so
+    # with a background thread it is built while the chicken crosses the
+    # previous one and the game only appends finished lanes. Chunks depend
+    # only on the request, never on timing, so threaded and inline
+    # generation make the same world. The worker shares the EntityPool:
+    # its free lists are only popped and extended, which CPython does
+    # atomically.
+    def __init__(self, tuning, pool=None, background=False):
+        self.tuning = tuning
+        self.pool = pool
+        self.executor = concurrent.futures.ThreadPoolExecutor(1) if background else None
+        self.ready = collections.deque()
+        self.saved = None  # snapshot() until the waiting lanes change
+        self.reset(0)
+    
+    def reset(self, seed, start=0):
+        # Hand out the lanes of world `seed` from lane `start` on
+        self.release()
+        self.seed = seed
+        self.start = start
+        self.next_chunk = start // CHUNK_LANES
+        self.previous = None  # generate_chunk's (type, reach) of the last lane built
+        self.pending = None  # The requested chunk: a Future, or its lanes
+    
+    def release(self):
+        # Give unused lanes back to the pool; a chunk still being built
+        # belongs to an abandoned world and is simply dropped
+        if self.pool is not None:
+            for lane in self.ready:
+                self.pool.release(lane)
+        self.ready.clear()
+        self.pending = None
+        self.saved = None
+    
+    def request(self, score):
+        args = (self.seed, self.next_chunk, score, self.previous, self.tuning, self.pool)
+        if self.executor is not None:
+            self.pending = self.executor.submit(generate_chunk, *args)
+        else:
+            self.pending = generate_chunk(*args)
+        self.next_chunk += 1
+    
+    def settle(self):
+        # Wait for the requested chunk, if any, and queue its lanes
+        if self.pending is None:
+            return
+        chunk = self.pending
+        if self.executor is not None:
+            chunk = chunk.result()
+        self.pending = None
+        self.saved = None
+        lanes, self.previous = chunk
+        for lane in lanes:
+            if lane.y >= self.start:
+                self.ready.append(lane)
+            elif self.pool is not None:
+                self.pool.release(lane)
+    
+    def take(self, score):
+        # The next lane; score is the difficulty of any new request
+        if not self.ready:
+            if self.pending is None:
+                self.request(score)
+            self.settle()
+        lane = self.ready.popleft()
+        self.saved = None
+        if self.pending is None and len(self.ready) < CHUNK_LANES:
+            # Start on the next chunk while this one is used up
+            self.request(score)
+        return lane
+    
+    def snapshot(self):
+        # Plain values for a Snapshot, the waiting lanes as Lane.snapshot() states
+        self.settle()
+        if self.saved is None:
+            self.saved = (self.seed, self.start, self.next_chunk, self.previous,
+                          tuple([lane.snapshot() for lane in self.ready]))
+        return self.saved
+    
+    def restore(self, state, build):
+        # build: turns a Lane.snapshot() state back into a lane. Waiting
+        # lanes the snapshot saw are kept; nothing moves them while they wait.
+        kept = {lane.y: lane for lane in self.ready}
+        self.ready.clear()
+        self.pending = None
+        self.saved = state
+        self.seed, self.start, self.next_chunk, self.previous, ready = state
+        for lane_state in ready:
+            lane = kept.get(lane_state[0][0])
+            if lane is not None and lane.layout is lane_state[0]:
+                del kept[lane.y]
+            else:
+                lane = build(lane_state)
+            self.ready.append(lane)
+        if self.pool is not None:
+            for lane in kept.values():
+                self.pool.release(lane)
+
+
+class EntityPool:
+    # Free lists of lanes and entities that have scrolled away. make() hands
+    # one back re-initialised in place, so a long session keeps reusing the
+    # same few hundred objects instead of feeding the garbage collector.
+    def __init__(self):
+        self.free = {Lane: [], Vehicle: [], Log: [], Train: []}
+        self.created = 0
+        self.reused = 0
+    
+    def make(self, cls, *args):
+        # Safe to call from LaneGenerator's worker as well: pop() either
+        # takes an object no other thread can get, or finds the list empty
+        try:
+            obj = self.free[cls].pop()
+        except IndexError:
+            self.created += 1
+            return cls(*args)
+        obj.__init__(*args)
+        self.reused += 1
+        return obj
+    
+    def release(self, lane):
+        self.free[Vehicle].extend(lane.vehicles)
+        self.free[Log].extend(lane.logs)
+        if lane.train:
+            self.free[Train].append(lane.train)
+        self.free[Lane].append(lane)
+
+
+class GcMonitor:
+    # Garbage collections per generation and the time spent in them, from
+    # gc.callbacks; take_frame() returns the pause since it was last called
+    def __init__(self):
+        self.collections = [0, 0, 0]
+        self.pause = 0.0
+        self.max_pause = 0.0
+        self.frame_pause = 0.0
+        self.started = None
+    
+    def install(self):
+        gc.callbacks.append(self.callback)
+    
+    def uninstall(self):
+        gc.callbacks.remove(self.callback)
+    
+    def callback(self, phase, info):
+        if phase == "start":
+            self.started = time.perf_counter()
+        elif self.started is not None:
+            pause = time.perf_counter() - self.started
+            self.started = None
+            self.collections[info["generation"]] += 1
+            self.pause += pause
+            self.frame_pause += pause
+            self.max_pause = max(self.max_pause, pause)
+    
+    def take_frame(self):
+        pause, self.frame_pause = self.frame_pause, 0.0
+        return pause
+
+
+class FrameProfiler:
+    # Where Game.run's frame time goes. The loop calls begin_frame(), then
+    # mark(phase) after each phase, charging it the time since the last
+    # mark, then end_frame(game). Games without a profiler skip every mark
+    # with a single None test. Stats feed the F3 overlay, and each frame
+    # can be streamed to a CSV, JSON or JSON Lines file. A GcMonitor is
+    # installed while profiling, so each frame also carries its GC pause
+    # and collections.
+    PHASES = ("input", "pilot", "player", "generate", "lanes", "trains", "collisions",
+              "draw", "tick")
+    HISTOGRAM_MS = (4, 8, 12, 16.7, 20, 33.3, 50)  # Bucket upper edges; the last bucket is open
+    WINDOW = FPS  # Frames the overlay averages over
+    REFRESH = 15  # Frames between overlay text refreshes
+    
+    def __init__(self, path=None, budget=SIM_DT):
+        # budget: seconds of work (everything but the tick) a frame may take
+        # before it counts as an overrun; None never overruns
+        self.budget = budget
+        self.overlay = False
+        self.recent = collections.deque(maxlen=self.WINDOW)  # (frame time, phase times)
+        self.histogram = [0] * (len(self.HISTOGRAM_MS) + 1)
+        self.frames = 0
+        self.overruns = 0
+        self.worst = 0.0
+        self.counts = (0, 0, 0)  # Live lanes, active lanes, entities
+        self.input = None  # The game's InputQueue, for its latencies
+        self.governor = None  # The game's QualityGovernor, for its levels
+        self.quality = QUALITY_FULL
+        self.gc = GcMonitor()
+        self.gc.install()
+        self.gc_seen = [0, 0, 0]  # gc.collections as of the previous frame
+        self.gc_frames = 0  # Frames with at least one collection
+        self.started = time.perf_counter()
+        self.begin_frame()  # So marks made before the loop's first frame land somewhere
+        self.panel = None
+        self.font = None
+        self.path = path
+        self.file = None
+        if path is not None:
+            self.file = open(path, "w", newline="")
+            self.format = os.path.splitext(path)[1].lower()
+            self.columns = (["frame", "game_frame", "time", "frame_ms", "work_ms"]
+                            + [f"{phase}_ms" for phase in self.PHASES]
+                            + ["lanes", "active_lanes", "entities", "quality",
+                               "gc_ms", "gc_gen0", "gc_gen1", "gc_gen2"])
+            if self.format == ".csv":
+                self.file.write(",".join(self.columns) + "\n")
+            elif self.format == ".json":
+                self.file.write("[")
+    
+    def begin_frame(self):
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.start = self.last = time.perf_counter()
+    
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.times[phase] += now - self.last
+        self.last = now
+    
+    def end_frame(self, game):
+        times = self.times
+        frame_time = self.last - self.start
+        work = frame_time - times["tick"]
+        self.frames += 1
+        self.recent.append((frame_time, times))
+        self.worst = max(self.worst, frame_time)
+        if self.budget is not None and work > self.budget:
+            self.overruns += 1
+        milliseconds = frame_time * 1000
+        bucket = 0
+        while bucket < len(self.HISTOGRAM_MS) and milliseconds > self.HISTOGRAM_MS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+        
+        lo, hi = game.active_range()
+        if game.entities is not None:
+            entities = game.entities.count
+        else:
+            entities = sum(len(lane.vehicles) + len(lane.logs) + (lane.train is not None)
+                           for lane in game.lanes)
+        active = min(hi, len(game.lanes)) - max(lo, game.lanes.start)
+        self.counts = (game.lanes.live_count(), max(0, active), entities)
+        self.input = game.input
+        self.governor = game.governor
+        self.quality = game.quality
+        gc_pause = self.gc.take_frame()
+        collections = [count - seen for count, seen in zip(self.gc.collections, self.gc_seen)]
+        self.gc_seen = list(self.gc.collections)
+        if any(collections):
+            self.gc_frames += 1
+        if self.file is not None:
+            row = ([self.frames, game.frame, round(self.start - self.started, 6),
+                    round(milliseconds, 4), round(work * 1000, 4)]
+                   + [round(times[phase] * 1000, 4) for phase in self.PHASES]
+                   + list(self.counts) + [self.quality, round(gc_pause * 1000, 4)] + collections)
+            if self.format == ".csv":
+                self.file.write(",".join(map(str, row)) + "\n")
+            else:
+                separator = "\n" if self.format != ".json" or self.frames == 1 else ",\n"
+                self.file.write(separator + json.dumps(dict(zip(self.columns, row))))
+    
+    def averages(self):
+        # Mean frame time and mean time per phase over the recent window
+        frames = len(self.recent)
+        if not frames:
+            return 0.0, {}
+        mean = sum(frame_time for frame_time, _ in self.recent) / frames
+        return mean, {phase: sum(times[phase] for _, times in self.recent) / frames
+                      for phase in self.PHASES}
+    
+    def draw(self, screen, dirty=None):
+        # The overlay: a cached text panel, re-rendered every REFRESH frames
+        if self.panel is None or self.frames % self.REFRESH == 0:
+            self.render_panel()
+        rect = screen.blit(self.panel, (SCREEN_WIDTH - self.panel.get_width() - 10, 50))
+        if dirty is not None:
+            dirty.append(rect)
+    
+    def render_panel(self):
+        if self.font is None:
+            self.font = load_font(20)
+        mean, phases = self.averages()
+        lanes, active, entities = self.counts
+        lines = [f"{1 / mean if mean else 0:5.1f} FPS  {mean * 1000:5.2f} ms  (worst {self.worst * 1000:.1f})",
+                 f"overruns {self.overruns} of {self.frames}",
+                 f"lanes {lanes} ({active} active), entities {entities}"]
+        lines += self.latency_lines() + self.quality_lines() + self.gc_lines()
+        lines += [f"{phase:>10} {phases.get(phase, 0.0) * 1000:7.3f} ms" for phase in self.PHASES]
+        texts = [self.font.render(line, True, WHITE) for line in lines]
+        line_height = self.font.get_linesize()
+        bars = len(self.histogram)
+        width = max(text.get_width() for text in texts) + 20
+        height = line_height * (len(texts) + bars) + 20
+        panel = pygame.Surface((width, height))
+        panel.fill(BLACK)
+        panel.set_alpha(200)
+        y = 10
+        for text in texts:
+            panel.blit(text, (10, y))
+            y += line_height
+        # Frame time histogram, one bar per bucket scaled to the fullest
+        total = max(self.histogram) or 1
+        edges = ("0",) + tuple(str(edge) for edge in self.HISTOGRAM_MS)
+        for bucket, count in enumerate(self.histogram):
+            label = f"{edges[bucket]}-{edges[bucket + 1]}" if bucket < bars - 1 else f">{edges[-1]}"
+            text = self.font.render(f"{label:>9} ms", True, WHITE)
+            panel.blit(text, (10, y))
+            bar = int((width - 100) * count / total)
+            pygame.draw.rect(panel, YELLOW if bucket < 4 else RED, (90, y + 2, bar, line_height - 4))
+            y += line_height
+        self.panel = panel
+    
+    def summary(self):
+        mean, phases = self.averages()
+        lines = [f"{self.frames} frames, {self.overruns} over budget, worst {self.worst * 1000:.1f} ms"]
+        edges = ("0",) + tuple(str(edge) for edge in self.HISTOGRAM_MS)
+        for bucket, count in enumerate(self.histogram):
+            label = f"{edges[bucket]}-{edges[bucket + 1]}" if bucket < len(edges) - 1 else f">{edges[-1]}"
+            lines.append(f"  {label:>9} ms: {count}")
+        lines += self.latency_lines() + self.quality_lines() + self.gc_lines()
+        if self.governor is not None:
+            lines.append("  " + ", ".join(f"{name} {seconds:.1f} s" for name, seconds
+                                          in zip(QUALITY_NAMES, self.governor.seconds)))
+        return "\n".join(lines)
+    
+    def latency_lines(self):
+        latency = self.input.percentiles() if self.input is not None else {}
+        if not latency:
+            return []
+        return [f"input p50 {latency[50]:.1f} p90 {latency[90]:.1f} p99 {latency[99]:.1f} ms, "
+                f"{self.input.dropped} dropped"]
+    
+    def gc_lines(self):
+        gc_monitor = self.gc
+        return [f"gc {'/'.join(map(str, gc_monitor.collections))} collections in "
+                f"{self.gc_frames} frames, {gc_monitor.pause * 1000:.1f} ms "
+                f"(worst {gc_monitor.max_pause * 1000:.2f})"]
+    
+    def quality_lines(self):
+        if self.governor is None:
+            return [f"quality {QUALITY_NAMES[self.quality]} (fixed)"]
+        return [f"quality {QUALITY_NAMES[self.quality]}, {self.governor.changes} changes"]
+    
+    def close(self):
+        if self.gc.callback in gc.callbacks:
+            self.gc.uninstall()
+        if self.file is not None:
+            if self.format == ".json":
+                self.file.write("]\n")
+            self.file.close()
+            self.file = None
+
+
+class QualityGovernor:
+    # Picks Game.quality from frame times. Each frame's work (everything but
+    # the wait for the next frame) feeds a moving average; once the average
+    # has stayed over QUALITY_DROP of the budget for QUALITY_HOLD frames the
+    # quality drops a level, and once it has stayed under QUALITY_RAISE for
+    # `recover` frames it rises one. The gap between the thresholds and the
+    # holds keep the level from flickering. A raise undone within `recover`
+    # frames doubles `recover`, so a level the machine can only just not
+    # afford is retried ever more rarely; one that lasts resets it.
+    def __init__(self, budget=SIM_DT):
+        self.budget = budget
+        self.level = QUALITY_FULL
+        self.average = None
+        self.streak = 0  # Frames past a threshold: > 0 over QUALITY_DROP, < 0 under QUALITY_RAISE
+        self.recover = QUALITY_RECOVER
+        self.frames = 0
+        self.raised_at = None  # Frame of the last raise
+        self.changes = 0
+        self.seconds = [0.0] * len(QUALITY_NAMES)  # Time spent at each level
+        self.last = time.perf_counter()
+    
+    def update(self, work):
+        # work: seconds the frame took; returns the level for the next one
+        now = time.perf_counter()
+        self.seconds[self.level] += now - self.last
+        self.last = now
+        self.frames += 1
+        if self.average is None:
+            self.average = work
+        else:
+            self.average += (work - self.average) * QUALITY_SMOOTHING
+        if self.average > self.budget * QUALITY_DROP:
+            self.streak = max(self.streak, 0) + 1
+            if self.streak >= QUALITY_HOLD and self.level < len(QUALITY_NAMES) - 1:
+                undone = self.raised_at is not None and self.frames - self.raised_at < self.recover
+                self.recover = min(self.recover * 2, QUALITY_RECOVER_MAX) if undone else QUALITY_RECOVER
+                self.change(self.level + 1)
+        elif self.average < self.budget * QUALITY_RAISE:
+            self.streak = min(self.streak, 0) - 1
+            if -self.streak >= self.recover and self.level > QUALITY_FULL:
+                self.raised_at = self.frames
+                self.change(self.level - 1)
+        else:
+            self.streak = 0
+        return self.level
+    
+    def change(self, level):
+        self.level = level
+        self.streak = 0
+        self.changes += 1
+    
+    def telemetry(self):
+        # The current level and seconds spent at each, for logs and tools
+        return {"level": self.level, "name": QUALITY_NAMES[self.level],
+                "average_ms": round((self.average or 0.0) * 1000, 3),
+                "changes": self.changes,
+                "seconds": dict(zip(QUALITY_NAMES, (round(seconds, 3) for seconds in self.seconds)))}
+
+
+class InputQueue:
+    # Move key presses waiting for the chicken, each with the time it was
+    # read. Player.move ignores moves mid-hop, so up to `size` presses are
+    # held here and started one by one as the hop before lands; presses
+    # beyond that are dropped (and counted). Every started move's latency,
+    # from key down to the first drawn frame with the chicken moving, is
+    # kept for percentiles(), along with whether it waited for a hop.
+    def __init__(self, size=INPUT_BUFFER):
+        self.size = size
+        self.moves = collections.deque()  # (action, timestamp, pressed mid-hop)
+        self.started = []  # (timestamp, pressed mid-hop) of moves started since the last drawn frame
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)  # (seconds, pressed mid-hop)
+        self.dropped = 0
+    
+    def push(self, action, timestamp, moving):
+        # moving: the chicken is mid-hop, so the press has to wait its turn
+        if len(self.moves) >= self.size + (not moving):
+            self.dropped += 1
+            return
+        self.moves.append((action, timestamp, moving or bool(self.moves)))
+    
+    def shown(self, now):
+        # A frame was drawn at `now`: moves started before it are on screen
+        for timestamp, buffered in self.started:
+            self.latencies.append((now - timestamp, buffered))
+        self.started.clear()
+    
+    def clear(self):
+        self.moves.clear()
+        self.started.clear()
+    
+    def percentiles(self, points=(50, 90, 99), buffered=None):
+        # Latency percentiles in milliseconds (nearest rank), plus the worst,
+        # over the last LATENCY_SAMPLES moves; empty before the first move.
+        # buffered=False keeps only presses made standing still, True only
+        # those that waited for a hop to land
+        samples = sorted(latency for latency, waited in self.latencies
+                         if buffered is None or waited == buffered)
+        if not samples:
+            return {}
+        result = {point: samples[max(0, math.ceil(len(samples) * point / 100) - 1)] * 1000
+                  for point in points}
+        result["max"] = samples[-1] * 1000
+        return result
+
+
+def init_display():
+    # What a window needs: the display (which brings events) and fonts.
+    # pygame.init() would also start audio, joysticks and the rest, which
+    # the game never uses
+    pygame.display.init()
+    pygame.font.init()
+
+
+def load_font(size):
+    # pygame's default font, starting the font module on first use
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return pygame.font.Font(None, size)
+
+
+def paint_tree(screen, center_x, center_y):
+    pygame.draw.circle(screen, DARK_GREEN, (center_x, center_y), TILE_SIZE // 3)
+
+
+class SpriteCache:
+    # Each distinct entity look rendered once, with the same paint() code the
+    # uncached path uses, then blitted. Keys cover everything that changes a
+    # look: car vs. truck, log length, train length, and whether the render
+    # quality keeps the details (see QUALITY_NAMES).
+    def __init__(self):
+        self.sprites = {}
+    
+    def render(self, size, alpha, paint):
+        surface = pygame.Surface(size, pygame.SRCALPHA if alpha else 0)
+        paint(surface)
+        # convert() needs a display mode; offscreen callers keep the raw surface
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha() if alpha else surface.convert()
+        return surface
+    
+    def player(self, player):
+        sprite = self.sprites.get("player")
+        if sprite is None:
+            center = TILE_SIZE // 2
+            sprite = self.sprites["player"] = self.render(
+                (TILE_SIZE, TILE_SIZE), True, lambda surface: player.paint(surface, center, center))
+        return sprite
+    
+    def tree(self):
+        sprite = self.sprites.get("tree")
+        if sprite is None:
+            center = TILE_SIZE // 2
+            sprite = self.sprites["tree"] = self.render(
+                (TILE_SIZE, TILE_SIZE), True, lambda surface: paint_tree(surface, center, center))
+        return sprite
+    
+    def vehicle(self, vehicle, windows=True):
+        key = ("vehicle", vehicle.type, windows)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            size = (int(vehicle.width * TILE_SIZE), int(TILE_SIZE * 0.7))
+            sprite = self.sprites[key] = self.render(
+                size, False, lambda surface: vehicle.paint(surface, 0, -VEHICLE_TOP, windows))
+        return sprite
+    
+    def log(self, log, decorations=True):
+        key = ("log", log.length, decorations)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            # One extra row: the texture lines run a pixel past the log body.
+            # A plain log fills its sprite, which then needs no alpha.
+            size = (int(log.length * TILE_SIZE), int(TILE_SIZE * 0.6) + decorations)
+            sprite = self.sprites[key] = self.render(
+                size, decorations, lambda surface: log.paint(surface, 0, -LOG_TOP, decorations))
+        return sprite
+    
+    def train(self, train, decorations=True):
+        key = ("train", train.length, decorations)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            size = (int(train.length * TILE_SIZE), int(TILE_SIZE * 0.8))
+            sprite = self.sprites[key] = self.render(
+                size, False, lambda surface: train.paint(surface, 0, -TRAIN_TOP, decorations))
+        return sprite
+    
+    def warm(self):
+        # Render every look the generator can produce, at full detail then
+        # at the reduced ones, one per step, so none is first rendered mid-game
+        yield lambda: self.player(Player(0, 0))
+        yield self.tree
+        for detail in (True, False):
+            for vehicle_type in ("car", "truck"):
+                yield lambda vehicle_type=vehicle_type, detail=detail: self.vehicle(
+                    Vehicle(0, 0, 0, 1, vehicle_type), detail)
+            for length in (2, 3):
+                yield lambda length=length, detail=detail: self.log(Log(0, 0, 0, 1, length), detail)
+            yield lambda detail=detail: self.train(Train(0, 1), detail)
+
+
+class StaticLayer:
+    # Off-screen strip with the static layer (ground, road lines, trees) of the
+    # lanes around the camera. A lane is painted once when it scrolls into the
+    # strip; each frame the strip is blitted at the camera offset and only the
+    # moving entities are drawn on top.
     def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Crossy Road")
-        self.clock = pygame.time.Clock()
+        self.rows = GRID_HEIGHT + LANE_KEEP_BEHIND + 3
+        self.surface = pygame.Surface((SCREEN_WIDTH, self.rows * TILE_SIZE))
+        self.base = None   # Lane y painted in the strip's bottom row
+        self.lanes = None  # Lane store the strip was painted from
+        self.quality = QUALITY_FULL  # Quality lanes are painted at, set by sync()
+    
+    def row_top(self, lane_y):
+        return (self.base + self.rows - 1 - lane_y) * TILE_SIZE
+    
+    def paint_row(self, lanes, lane_y, sprites):
+        lane = lanes.get(lane_y)
+        top = self.row_top(lane_y)
+        if lane is None:
+            self.surface.fill(BLACK, (0, top, SCREEN_WIDTH, TILE_SIZE))
+        else:
+            lane.draw_background(self.surface, top, sprites, self.quality)
+    
+    def sync(self, lanes, camera_y, sprites, quality=QUALITY_FULL):
+        base = int(camera_y) - LANE_KEEP_BEHIND
+        self.quality = quality
+        if lanes is not self.lanes or self.base is None or not 0 <= base - self.base < self.rows:
+            # New world, a jump past the whole strip or an invalidate(): repaint everything
+            self.lanes = lanes
+            self.base = base
+            for lane_y in range(base, base + self.rows):
+                self.paint_row(lanes, lane_y, sprites)
+        elif base > self.base:
+            # Scroll the strip down and paint the lanes that entered at the top
+            shift = base - self.base
+            self.surface.scroll(0, shift * TILE_SIZE)
+            self.base = base
+            for lane_y in range(base + self.rows - shift, base + self.rows):
+                self.paint_row(lanes, lane_y, sprites)
+    
+    def invalidate(self):
+        # The painted lanes no longer look like this; repaint on the next sync
+        self.base = None
+    
+    def blit(self, screen, camera_y):
+        # Place the strip by its bottom row, whose screen y is always positive
+        # and so truncates the same way the full redraw does
+        bottom = int((camera_y + GRID_HEIGHT - 1 - self.base) * TILE_SIZE)
+        top = bottom - (self.rows - 1) * TILE_SIZE
+        screen.blit(self.surface, (0, top))
+        return top
+
+
+class Hud:
+    # Score, eagle warning and game-over UI. Fonts, fixed text and the shadow
+    # overlay are built on first use and reused; the score text is only
+    # re-rendered when the score changes. The first frame only needs the
+    # score font; the rest is built by load_messages(), when first needed
+    # or during Game.run's warm-up.
+    def __init__(self):
+        self.font = None
+        self.messages_loaded = False
+        self.score = None
+        self.score_text = None
+    
+    def load_messages(self):
+        if self.font is None:
+            self.font = load_font(36)
+        warning_font = load_font(48)
+        game_over_font = load_font(72)
+        
+        self.warning_text = warning_font.render("EAGLE INCOMING!", True, RED)
+        self.warning_pos = (SCREEN_WIDTH // 2 - self.warning_text.get_width() // 2, 100)
+        self.game_over_text = game_over_font.render("GAME OVER", True, RED)
+        self.game_over_pos = (SCREEN_WIDTH // 2 - self.game_over_text.get_width() // 2,
+                              SCREEN_HEIGHT // 2 - 50)
+        self.restart_text = self.font.render("Press SPACE to Restart", True, WHITE)
+        self.restart_pos = (SCREEN_WIDTH // 2 - self.restart_text.get_width() // 2,
+                            SCREEN_HEIGHT // 2 + 20)
+        
+        # Darkening shadow for the eagle warning; only its alpha changes per frame
+        self.shadow = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.shadow.fill(BLACK)
+        self.messages_loaded = True
+    
+    def draw(self, screen, game, dirty=None):
+        if self.font is None:
+            self.font = load_font(36)
+        
+        if game.score != self.score:
+            self.score = game.score
+            self.score_text = self.font.render(f"Score: {game.score}", True, WHITE)
+        rect = screen.blit(self.score_text, (10, 10))
+        if dirty is not None:
+            dirty.append(rect)
+        
+        # Draw eagle warning if idle for too long (after game started)
+        player = game.player
+        if game.game_started and not player.moving:
+            time_left = player.max_idle_time - player.idle_timer
+            # Show warning in last 2 seconds (120 frames)
+            if time_left < 120:
+                if not self.messages_loaded:
+                    self.load_messages()
+                warning_alpha = min(255, (120 - time_left) * 4)
+                if game.quality >= QUALITY_NO_SHADOW:
+                    # A black frame that thickens instead of a full-screen blend
+                    rect = pygame.draw.rect(screen, BLACK, screen.get_rect(), warning_alpha // 16 + 1)
+                else:
+                    self.shadow.set_alpha(warning_alpha // 3)
+                    rect = screen.blit(self.shadow, (0, 0))
+                if dirty is not None:
+                    dirty.append(rect)
+                
+                # Flash warning text in last second
+                if time_left < 60 and time_left % 20 < 10:
+                    screen.blit(self.warning_text, self.warning_pos)
+        
+        if game.game_over:
+            if not self.messages_loaded:
+                self.load_messages()
+            rect = screen.blit(self.game_over_text, self.game_over_pos)
+            restart = screen.blit(self.restart_text, self.restart_pos)
+            if dirty is not None:
+                dirty.append(rect)
+                dirty.append(restart)
+
+
+class LaneWindow:
+    # Sliding window of lanes addressed by absolute lane index (lane.y).
+    # Lanes live in a power-of-two ring buffer; len() is the number of lanes
+    # ever generated, so `lanes[grid_y]` and `len(lanes)` keep their meaning
+    # while lanes that fall behind the camera are evicted.
+    def __init__(self, capacity=64, start=0):
+        # start: absolute index of the first lane to be appended
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.slots = [None] * size
+        self.mask = size - 1
+        self.start = start  # Absolute index of the oldest live lane
+        self.end = start    # Absolute index one past the newest lane
+
+    def __len__(self):
+        return self.end
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.end
+        if index < self.start or index >= self.end:
+            raise IndexError(f"lane {index} is outside the window [{self.start}, {self.end})")
+        return self.slots[index & self.mask]
+
+    def __iter__(self):
+        for index in range(self.start, self.end):
+            yield self.slots[index & self.mask]
+
+    def get(self, index):
+        if self.start <= index < self.end:
+            return self.slots[index & self.mask]
+        return None
+
+    def live_count(self):
+        return self.end - self.start
+
+    def span(self, lo, hi):
+        # Live lanes with lo <= y < hi, in order
+        lo = max(self.start, lo)
+        hi = min(self.end, hi)
+        for index in range(lo, hi):
+            yield self.slots[index & self.mask]
+
+    def append(self, lane):
+        if self.end - self.start == len(self.slots):
+            self._grow()
+        self.slots[self.end & self.mask] = lane
+        self.end += 1
+
+    def evict_below(self, index):
+        # Drop every lane with y < index and return them
+        evicted = []
+        index = min(index, self.end)
+        while self.start < index:
+            slot = self.start & self.mask
+            evicted.append(self.slots[slot])
+            self.slots[slot] = None
+            self.start += 1
+        return evicted
+
+    def _grow(self):
+        lanes = list(self)
+        size = len(self.slots) * 2
+        self.slots = [None] * size
+        self.mask = size - 1
+        for index, lane in zip(range(self.start, self.end), lanes):
+            self.slots[index & self.mask] = lane
+
+
+class EntityEngine:
+    # Structure-of-arrays store for every live vehicle, log and train.
+    # Rows are kept in lane order (lanes are only appended ahead and evicted
+    # behind), so a lane's entities are one contiguous slice found with
+    # searchsorted. While the engine is in use its arrays are the source of
+    # truth for positions and train state; sync() copies them back onto the
+    # Vehicle/Log/Train objects that drawing reads.
+    VEHICLE = 0
+    LOG = 1
+    TRAIN = 2
+
+    def __init__(self, capacity=256):
+        if np is None:
+            raise RuntimeError("the numpy entity engine needs NumPy installed")
+        self.count = 0
+        self.objects = []
+        self.occupancy = {}  # lane y -> (deadly, platform) for this step
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, "x", None)
+        arrays = {
+            "x": np.zeros(capacity),
+            "speed": np.zeros(capacity),
+            "direction": np.zeros(capacity),
+            "size": np.zeros(capacity),       # Vehicle width, log/train length
+            "wrap": np.zeros(capacity),       # Distance past the edge before wrapping
+            "lane": np.zeros(capacity, dtype=np.int64),
+            "kind": np.zeros(capacity, dtype=np.int8),
+            "warning": np.zeros(capacity, dtype=np.int64),
+            "active": np.zeros(capacity, dtype=bool),
+        }
+        for name, array in arrays.items():
+            if old is not None:
+                array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def clear(self):
+        # Drop every row, keeping the arrays for the next add_lane
+        self.count = 0
+        self.objects.clear()
+        self.occupancy.clear()
+
+    def add_lane(self, lane):
+        rows = []
+        for vehicle in lane.vehicles:
+            rows.append((vehicle, self.VEHICLE, vehicle.width, 2))
+        for log in lane.logs:
+            rows.append((log, self.LOG, log.length, log.length))
+        if lane.train:
+            rows.append((lane.train, self.TRAIN, lane.train.length, 0))
+        if self.count + len(rows) > self.capacity:
+            self._allocate(max(self.capacity * 2, self.count + len(rows)))
+        for obj, kind, size, wrap in rows:
+            i = self.count
+            self.x[i] = obj.x
+            self.speed[i] = obj.speed
+            self.direction[i] = obj.direction
+            self.size[i] = size
+            self.wrap[i] = wrap
+            self.lane[i] = lane.y
+            self.kind[i] = kind
+            if kind == self.TRAIN:
+                self.warning[i] = obj.warning_timer
+                self.active[i] = obj.active
+            else:
+                self.warning[i] = 0
+                self.active[i] = False
+            self.objects.append(obj)
+            self.count += 1
+        self.occupancy.pop(lane.y, None)
+
+    def evict_below(self, lane_y):
+        n = self.count
+        k = int(np.searchsorted(self.lane[:n], lane_y, side="left"))
+        if k == 0:
+            return
+        for name in ("x", "speed", "direction", "size", "wrap", "lane", "kind", "warning", "active"):
+            array = getattr(self, name)
+            array[:n - k] = array[k:n]
+        del self.objects[:k]
+        self.count = n - k
+        self.occupancy.clear()
+
+    def rows(self, lane_y):
+        lanes = self.lane[:self.count]
+        return (int(np.searchsorted(lanes, lane_y, side="left")),
+                int(np.searchsorted(lanes, lane_y, side="right")))
+
+    def update(self, lo=None, hi=None):
+        # One vectorized pass mirroring Vehicle/Log/Train.update, over the
+        # entities of lanes lo <= y < hi (all of them by default)
+        lanes = self.lane[:self.count]
+        start = 0 if lo is None else int(np.searchsorted(lanes, lo, side="left"))
+        end = self.count if hi is None else int(np.searchsorted(lanes, hi, side="left"))
+        rows = slice(start, end)
+        x = self.x[rows]
+        direction = self.direction[rows]
+        kind = self.kind[rows]
+        warning = self.warning[rows]
+        active = self.active[rows]
+        trains = kind == self.TRAIN
+
+        # Train warnings count down and release the train when they hit zero
+        warned = warning > 0
+        warning[warned] -= 1
+        released = warned & (warning == 0)
+        if released.any():
+            active[released] = True
+            length = self.size[rows][released]
+            x[released] = np.where(direction[released] > 0, -length, GRID_WIDTH + length)
+
+        moving = ~trains | active
+        x[moving] += self.speed[rows][moving] * direction[moving]
+
+        # Vehicles and logs wrap around once fully past the edge
+        wrap = self.wrap[rows]
+        right = ~trains & (direction > 0) & (x > GRID_WIDTH + wrap)
+        left = ~trains & (direction < 0) & (x < -wrap)
+        x[right] = -wrap[right]
+        x[left] = GRID_WIDTH + wrap[left]
+
+        # Trains switch off once they leave the screen
+        gone = active & (((direction > 0) & (x > GRID_WIDTH + 5)) | ((direction < 0) & (x < -5)))
+        active[gone] = False
+        self.occupancy.clear()
+    
+    def lane_masks(self, lane_y, river=False):
+        # (deadly, platform) bitmasks of one lane, built as Lane.masks builds
+        # them and cached until the next update
+        masks = self.occupancy.get(lane_y)
+        if masks is None:
+            start, end = self.rows(lane_y)
+            deadly = platform = 0
+            for i, x, size in zip(range(start, end), self.x[start:end].tolist(),
+                                  self.size[start:end].tolist()):
+                kind = self.kind[i]
+                if kind == self.VEHICLE:
+                    deadly |= columns_between(x, x + size)
+                elif kind == self.LOG:
+                    platform |= columns_between(x, x + size, closed=False)
+                elif self.active[i]:
+                    deadly |= columns_between(x, x + size, closed=False)
+            if river:
+                deadly |= FULL_ROW & ~platform
+            masks = self.occupancy[lane_y] = (deadly, platform)
+        return masks
+
+    def catch_up(self, lane_y, steps):
+        # Lane.catch_up for one lane's rows, with the same scalar maths
+        start, end = self.rows(lane_y)
+        for i in range(start, end):
+            x, speed, direction = float(self.x[i]), float(self.speed[i]), float(self.direction[i])
+            if self.kind[i] == self.TRAIN:
+                active, x, warning = train_state_after(x, speed, direction, float(self.size[i]),
+                                                       bool(self.active[i]), int(self.warning[i]), steps)
+                self.active[i] = active
+                self.warning[i] = warning
+            else:
+                x = position_after(x, speed, direction, float(self.wrap[i]), steps)
+            self.x[i] = x
+        self.occupancy.pop(lane_y, None)
+
+    def trigger_warning(self, lane_y):
+        start, end = self.rows(lane_y)
+        for i in range(start, end):
+            if self.kind[i] == self.TRAIN and not self.active[i]:
+                self.warning[i] = self.objects[i].warning_duration
+
+    def vehicle_hit(self, lane_y, px):
+        start, end = self.rows(lane_y)
+        x = self.x[start:end]
+        hit = (self.kind[start:end] == self.VEHICLE) & (x <= px) & (px <= x + self.size[start:end])
+        return bool(hit.any())
+
+    def log_under(self, lane_y, px):
+        # The first log (in spawn order) the player stands on, or None
+        start, end = self.rows(lane_y)
+        x = self.x[start:end]
+        on = (self.kind[start:end] == self.LOG) & (x <= px) & (px < x + self.size[start:end])
+        hits = np.flatnonzero(on)
+        if len(hits) == 0:
+            return None
+        return self.objects[start + int(hits[0])]
+
+    def train_hit(self, lane_y, px):
+        start, end = self.rows(lane_y)
+        x = self.x[start:end]
+        hit = self.active[start:end] & (x <= px) & (px < x + self.size[start:end])
+        return bool(hit.any())
+
+    def sync(self, lo=None, hi=None):
+        # Copy array state back onto the entity objects of lanes lo <= y < hi
+        n = self.count
+        lanes = self.lane[:n]
+        start = 0 if lo is None else int(np.searchsorted(lanes, lo, side="left"))
+        end = n if hi is None else int(np.searchsorted(lanes, hi, side="left"))
+        xs = self.x[start:end].tolist()
+        for i, x in enumerate(xs, start):
+            obj = self.objects[i]
+            obj.x = x
+            if self.kind[i] == self.TRAIN:
+                obj.active = bool(self.active[i])
+                obj.warning_timer = int(self.warning[i])
+
+
+# Recording file layout: one header, then one record per input
+RECORDING_MAGIC = b"CRRP"
+RECORDING_VERSION = 6  # 2: train warnings are scheduled, lanes can lie dormant
+                       # 3: lanes come in separately seeded chunks
+                       # 4: lanes failing reach_after are drawn again
+                       # 5: reach_after allows for logs drifting apart
+                       # 6: train warnings start over as they used to
+RECORDING_HEADER = struct.Struct("<4sBQIIB")  # magic, version, seed, score, frames, died
+RECORDING_INPUT = struct.Struct("<IB")        # frame, action code
+
+
+class Recording:
+    # One run: its seed, the frame-indexed inputs, and how it ended
+    def __init__(self, seed, inputs=None, score=0, frames=0, died=False):
+        self.seed = seed
+        self.inputs = inputs if inputs is not None else []  # (frame, action)
+        self.score = score
+        self.frames = frames
+        self.died = died
+    
+    def record(self, frame, action):
+        self.inputs.append((frame, action))
+    
+    def finish(self, game):
+        self.score = game.score
+        self.frames = game.frame
+        self.died = game.game_over
+    
+    def save(self, path):
+        parts = [RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, self.seed,
+                                       self.score, self.frames, self.died)]
+        for frame, action in self.inputs:
+            parts.append(RECORDING_INPUT.pack(frame, ACTION_CODES[action]))
+        with open(path, "wb") as f:
+            f.write(b"".join(parts))
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, seed, score, frames, died = RECORDING_HEADER.unpack_from(data)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError(f"{path} is not a version {RECORDING_VERSION} recording")
+        inputs = [(frame, CODE_ACTIONS[code])
+                  for frame, code in RECORDING_INPUT.iter_unpack(data[RECORDING_HEADER.size:])]
+        return cls(seed, inputs, score, frames, bool(died))
+
+
+class Snapshot:
+    # A Game's whole state between two frames, as plain values (see
+    # Game.snapshot). Nothing in it refers to live game objects, so it
+    # stays valid however the game moves on, and can be restored any
+    # number of times.
+    __slots__ = ("frame", "score", "seed", "game", "player", "current_log", "lanes",
+                 "train_events", "rng", "generator", "inputs")
+    
+    def __init__(self, frame, score, seed, game, player, current_log, lanes, train_events,
+                 rng, generator, inputs):
+        self.frame = frame
+        self.score = score
+        self.seed = seed
+        self.game = game                  # Camera, progress and game-over fields
+        self.player = player              # Player attributes, except current_log
+        self.current_log = current_log    # (lane y, index in lane.logs) or None
+        self.lanes = lanes                # Lane.snapshot() of every live lane, in order
+        self.train_events = train_events  # The train warning heap
+        self.rng = rng                    # The game rng's getstate()
+        self.generator = generator        # LaneGenerator.snapshot(): lanes made but not yet added
+        self.inputs = inputs              # Inputs recorded so far, if recording
+
+
+class Game:
+    # Fields of a Game (beyond lanes, player and rng) that a Snapshot keeps
+    SNAPSHOT_FIELDS = ("camera_y", "prev_camera_y", "camera_target_y", "max_progress",
+                       "game_over", "death_cause", "game_started")
+    
+    def __init__(self, headless=False, engine="objects", sprites=True, render_mode="static",
+                 seed=None, record_dir=None, tuning=None, active_band=ACTIVE_BAND,
+                 pooling=True, profile=None, lane_thread=None, input_buffer=INPUT_BUFFER,
+                 input_poll=INPUT_POLL, startup_report=False, quality=None):
+        # Headless games never open a window or clock; drive them with step()
+        # engine="numpy" moves and collides entities with EntityEngine
+        # sprites=False draws every entity from primitives each frame
+        # render_mode="full" repaints every lane and flips the whole screen;
+        # "static" scrolls a cached lane layer and updates only dirty rects
+        # seed fixes the world of every run; None draws a fresh seed per run
+        # record_dir saves each run's inputs there as a Recording
+        # tuning overrides the difficulty/balance knobs (see Tuning)
+        # active_band is (behind, ahead): lanes around the camera simulated
+        # every step; it must cover the screen for drawn games
+        # pooling recycles evicted lanes and entities (see EntityPool)
+        # profile streams per-frame timings to that .csv/.json/.jsonl file
+        # (see FrameProfiler); F3 shows them in an overlay either way
+        # lane_thread builds lane chunks on a background thread (see
+        # LaneGenerator); by default windowed games do and headless ones don't
+        # input_buffer is how many moves pressed mid-hop wait for the landing
+        # (see InputQueue); input_poll is how often run() reads the keyboard
+        # while waiting for the next frame, None to read it once per frame
+        # startup_report prints Game.startup once the first frame is shown
+        # quality fixes the render quality (a QUALITY_* level); None lets a
+        # QualityGovernor pick it from frame times while run() runs
+        started = time.perf_counter()
+        if engine not in ("objects", "numpy"):
+            raise ValueError(f"unknown entity engine {engine!r}")
+        if render_mode not in ("full", "static"):
+            raise ValueError(f"unknown render mode {render_mode!r}")
+        if quality is not None and not QUALITY_FULL <= quality < len(QUALITY_NAMES):
+            raise ValueError(f"unknown render quality {quality!r}")
+        self.render_mode = render_mode
+        self.fixed_seed = seed
+        self.tuning = tuning if tuning is not None else Tuning()
+        self.active_band = active_band
+        self.pool = EntityPool() if pooling else None
+        self.generator = LaneGenerator(self.tuning, self.pool,
+                                       not headless if lane_thread is None else lane_thread)
+        self.profiler = FrameProfiler(profile) if profile is not None else None
+        self.frame_budget = SIM_DT  # Seconds per rendered frame; set by run()
+        self.quality = QUALITY_FULL if quality is None else quality
+        self.governor = QualityGovernor() if quality is None else None
+        self.input = InputQueue(input_buffer)
+        self.input_poll = input_poll
+        self.lanes = None
+        self.record_dir = record_dir
+        self.recording = None
+        self.static_layer = None
+        self.last_scroll = None  # Strip offset of the previous static frame
+        self.last_dirty = []     # Rects drawn over the strip last frame
+        self.headless = headless
+        self.engine = engine
+        # Seconds spent importing main, starting pygame's display, building
+        # the game and drawing the first frame, and from the start of the
+        # import to that frame being shown (filled in by run())
+        self.startup = {"import": IMPORTED - STARTED, "init": 0.0}
+        self.startup_report = startup_report
+        self.warm_up = None  # Tasks left for idle frame time (see warm_up_tasks)
+        if headless:
+            self.screen = None
+            self.clock = None
+        else:
+            init_started = time.perf_counter()
+            init_display()
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("Crossy Road")
+            self.clock = pygame.time.Clock()
+            self.startup["init"] = time.perf_counter() - init_started
+        self.sprites = SpriteCache() if sprites else None
+        self.hud = Hud()
         self.reset()
+        self.startup["game"] = time.perf_counter() - started - self.startup["init"]
     
-    def reset(self):
-        self.player = Player(GRID_WIDTH // 2, 0)
+    def reset(self, seed=None):
+        self.save_recording()
+        if seed is None:
+            seed = self.fixed_seed if self.fixed_seed is not None else random.randrange(2 ** 32)
+        self.seed = seed
+        self.rng = random.Random(seed)  # Train warnings; lanes come from self.generator
+        self.generator.reset(seed)
+        if self.record_dir is not None:
+            self.recording = Recording(seed)
+        
+        self.player = Player(START_COLUMN, 0)
         self.camera_y = 0
+        self.prev_camera_y = 0  # Camera one step ago, for interpolated rendering
         self.camera_target_y = 0
         self.score = 0
         self.max_progress = 0
         self.game_over = False
+        self.death_cause = None
         self.game_started = False  # Track if player has moved yet
-        self.lanes = []
+        self.frame = 0  # Simulation frames run since reset
+        if self.lanes is not None and self.pool is not None:
+            for lane in self.lanes:
+                self.pool.release(lane)
+        self.lanes = LaneWindow(GRID_HEIGHT + 20)
+        if self.static_layer is not None:
+            self.static_layer.invalidate()
+        self.last_scroll = None  # A new world; repaint the whole screen
+        self.train_events = []  # Heap of (frame, lane y) train warnings
+        self.entities = EntityEngine() if self.engine == "numpy" else None
+        self.rewind_buffer = collections.deque(maxlen=REWIND_SNAPSHOTS)
+        self.input.clear()
         
         # Generate initial lanes
         self.generate_initial_lanes()
     
     def generate_initial_lanes(self):
-        lane_types = ["grass", "road", "river", "train", "grass"]
-        
-        for i in range(GRID_HEIGHT + 20):
-            if i < 2:
-                lane_type = "grass"
+        for _ in range(GRID_HEIGHT + 20):
+            self.add_lane(self.generator.take(self.score))
+    
+    def new_lane(self, y, lane_type, direction, speed):
+        if self.pool is not None:
+            return self.pool.make(Lane, y, lane_type, direction, speed, self.rng, self.pool)
+        return Lane(y, lane_type, direction, speed, self.rng)
+    
+    def lane_from(self, state):
+        # A lane built from a Lane.snapshot() state
+        layout = state[0]
+        lane = self.new_lane(layout[0], None, layout[2], layout[3])
+        lane.restore(state)
+        return lane
+    
+    def add_lane(self, lane):
+        lane.frame = self.frame
+        self.lanes.append(lane)
+        if self.entities is not None:
+            self.entities.add_lane(lane)
+        if lane.train:
+            self.schedule_warning(lane, self.frame)
+    
+    def schedule_warning(self, lane, idle_from):
+        # Roll the idle train's per-step warning chance for every step from
+        # idle_from on in a single draw
+        steps = geometric_steps(self.rng, self.tuning.train_warning_chance)
+        if steps is not None:
+            heapq.heappush(self.train_events, (idle_from + steps - 1, lane.y))
+    
+    def run_train_events(self):
+        events = self.train_events
+        while events and events[0][0] <= self.frame:
+            _, lane_y = heapq.heappop(events)
+            lane = self.lanes.get(lane_y)
+            if lane is None:
+                continue  # Scrolled away
+            self.catch_up(lane, self.frame)
+            if self.entities is not None:
+                self.entities.trigger_warning(lane_y)
             else:
-                lane_type = random.choice(lane_types)
-                
-                # Don't put hazards right next to each other too often
-                if len(self.lanes) > 0 and self.lanes[-1].type in ["river", "train"]:
-                    if random.random() < 0.6:
-                        lane_type = "grass"
-            
-            direction = random.choice([1, -1])
-            base_speed = INITIAL_VEHICLE_SPEED if lane_type == "road" else INITIAL_LOG_SPEED
-            speed = base_speed * random.uniform(0.7, 1.3)
-            
-            self.lanes.append(Lane(i, lane_type, direction, speed))
+                lane.train.trigger_warning()
+            # The chance is still rolled on every step of the warning (the
+            # train is not running yet), and a hit starts it over
+            train = lane.train
+            steps = geometric_steps(self.rng, self.tuning.train_warning_chance)
+            if steps is not None and steps < train.warning_duration:
+                heapq.heappush(events, (self.frame + steps, lane_y))
+            else:
+                self.schedule_warning(lane, self.frame + train.run_steps())
+    
+    def active_range(self):
+        # Lanes lo <= y < hi simulated this step; always includes the
+        # chicken's lane and the one it may be hopping onto
+        behind, ahead = self.active_band
+        base = int(self.camera_y)
+        return (min(base - behind, self.player.grid_y),
+                max(base + ahead, self.player.grid_y + 2))
+    
+    def catch_up(self, lane, frame):
+        # Bring a dormant lane's entities forward to the end of `frame`
+        steps = frame - lane.frame
+        if steps > 0:
+            if self.entities is not None:
+                self.entities.catch_up(lane.y, steps)
+            else:
+                lane.catch_up(steps)
+            lane.frame = frame
     
     def update(self):
+        self.prev_camera_y = self.camera_y
         if self.game_over:
+            # Nothing moves any more; stop interpolating between old states
+            self.player.prev_x = self.player.x
+            self.player.prev_y = self.player.y
             return
         
+        self.frame += 1
+        
         # Update player
         self.player.update()
         
@@ -438,8 +2102,7 @@ class Game:
             # Bottom of screen is at camera_y + GRID_HEIGHT - 1
             player_screen_y = self.camera_y + GRID_HEIGHT - 1 - self.player.grid_y
             if player_screen_y >= GRID_HEIGHT - 0.5:  # Player is at or below bottom edge
-                self.player.alive = False
-                self.game_over = True
+                self.end_game("camera")
                 return
         
         # Update score (based on forward progress)
@@ -455,41 +2118,55 @@ class Game:
             self.player.idle_timer += 1
             if self.player.idle_timer >= self.player.max_idle_time:
                 # Eagle attack! Game over
-                self.player.alive = False
-                self.game_over = True
+                self.end_game("eagle")
                 return
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.mark("player")
         
         # Generate new lanes ahead
-        while len(self.lanes) < self.camera_y + GRID_HEIGHT + 10:
-            lane_types = ["grass", "road", "river", "train", "grass"]
-            lane_type = random.choice(lane_types)
-            
-            if len(self.lanes) > 0 and self.lanes[-1].type in ["river", "train"]:
-                if random.random() < 0.6:
-                    lane_type = "grass"
-            
-            direction = random.choice([1, -1])
-            
-            # Progressive difficulty
-            difficulty_multiplier = 1 + (self.score / 200) * 0.2
-            base_speed = INITIAL_VEHICLE_SPEED if lane_type == "road" else INITIAL_LOG_SPEED
-            speed = base_speed * random.uniform(0.7, 1.3) * difficulty_multiplier
-            
-            new_y = len(self.lanes)
-            self.lanes.append(Lane(new_y, lane_type, direction, speed))
-        
-        # Update lanes
-        for lane in self.lanes:
-            lane.update()
+        self.generate_lanes()
+        if profiler is not None:
+            profiler.mark("generate")
+        
+        # Drop lanes that have scrolled out below the visible area
+        first_kept = int(self.camera_y) - LANE_KEEP_BEHIND
+        for lane in self.lanes.evict_below(first_kept):
+            if self.pool is not None:
+                self.pool.release(lane)
+        
+        if self.entities is not None:
+            self.entities.evict_below(first_kept)
+        
+        # Only lanes in the active band move; any that were dormant are first
+        # caught up to the previous step
+        lo, hi = self.active_range()
+        for lane in self.lanes.span(lo, hi):
+            if lane.frame < self.frame - 1:
+                self.catch_up(lane, self.frame - 1)
+            lane.frame = self.frame
+        if self.entities is not None:
+            self.entities.update(lo, hi)
+        else:
+            for lane in self.lanes.span(lo, hi):
+                lane.update()
+        if profiler is not None:
+            profiler.mark("lanes")
         
-        # Trigger train warnings randomly
-        for lane in self.lanes:
-            if lane.type == "train" and lane.train and not lane.train.active:
-                if random.random() < 0.01:  # 1% chance per frame
-                    lane.train.trigger_warning()
+        # Train warnings come off a schedule rather than a coin flip per lane
+        self.run_train_events()
+        if profiler is not None:
+            profiler.mark("trains")
         
         # Check collisions
         self.check_collisions()
+        if profiler is not None:
+            profiler.mark("collisions")
+    
+    def generate_lanes(self):
+        # Append lanes until the window reaches past the top of the screen
+        while len(self.lanes) < self.camera_y + GRID_HEIGHT + 10:
+            self.add_lane(self.generator.take(self.score))
     
     def check_collisions(self):
         if not self.player.alive:
@@ -507,26 +2184,20 @@ class Game:
         
         # Check vehicle collisions - only after landing
         if lane.type == "road":
-            for vehicle in lane.vehicles:
-                if vehicle.collides_with(self.player):
-                    self.player.alive = False
-                    self.game_over = True
-                    return
+            if self.vehicle_hits_player(lane):
+                self.end_game("vehicle")
+                return
         
         # Check water collisions - only after landing
         if lane.type == "river":
-            on_log = False
-            for log in lane.logs:
-                if log.is_player_on(self.player):
-                    on_log = True
-                    self.player.on_log = True
-                    self.player.current_log = log
-                    break
+            log = self.log_under_player(lane)
+            if log is not None:
+                self.player.on_log = True
+                self.player.current_log = log
             
             # Only die from water if player has landed and not on a log
-            if not on_log:
-                self.player.alive = False
-                self.game_over = True
+            if log is None:
+                self.end_game("water")
                 return
         
         # If player is on a log, move with it
@@ -538,68 +2209,253 @@ class Game:
             
             # Only die if player gets carried completely off screen
             if self.player.grid_x < -0.5 or self.player.grid_x >= GRID_WIDTH + 0.5:
-                self.player.alive = False
-                self.game_over = True
+                self.end_game("water")
                 return
         
         # Check train collisions - only after landing
         if lane.type == "train" and lane.train:
-            if lane.train.collides_with(self.player):
-                self.player.alive = False
-                self.game_over = True
+            if self.train_hits_player(lane):
+                self.end_game("train")
                 return
     
-    def draw(self):
-        self.screen.fill(BLACK)
+    def end_game(self, cause):
+        # cause: "vehicle", "water", "train", "eagle" or "camera"
+        self.player.alive = False
+        self.game_over = True
+        self.death_cause = cause
+    
+    def lane_masks(self, lane, steps=0):
+        # (blocked, deadly, platform) column bitmasks of lane this step, or
+        # as predicted `steps` updates ahead
+        steps += self.frame - lane.frame  # Dormant lanes are behind
+        if steps:
+            if self.entities is not None:
+                self.entities.sync(lane.y, lane.y + 1)
+            return lane.masks_after(steps)
+        if self.entities is not None:
+            deadly, platform = self.entities.lane_masks(lane.y, lane.type == "river")
+            return lane.blocked, deadly, platform
+        return lane.masks()
+    
+    def tile_state(self, x, y, steps=0):
+        # TILE_* flags of column x on lane y (0 is plain safe ground), now or
+        # `steps` updates ahead; columns off the board and lanes outside the
+        # window are blocked
+        lane = self.lanes.get(y)
+        if lane is None or not 0 <= x < GRID_WIDTH:
+            return TILE_BLOCKED
+        blocked, deadly, platform = self.lane_masks(lane, steps)
+        return ((blocked >> x & 1) * TILE_BLOCKED | (deadly >> x & 1) * TILE_DEADLY
+                | (platform >> x & 1) * TILE_PLATFORM)
+    
+    def player_column(self):
+        # The chicken's column when it stands exactly on one, else None
+        # (riding a log leaves it between columns)
+        px = self.player.grid_x
+        if 0 <= px < GRID_WIDTH and px == int(px):
+            return int(px)
+        return None
+    
+    def vehicle_hits_player(self, lane):
+        column = self.player_column()
+        if column is not None:
+            return self.lane_masks(lane)[1] >> column & 1 == 1
+        if self.entities is not None:
+            return self.entities.vehicle_hit(lane.y, self.player.grid_x)
+        for vehicle in lane.vehicles:
+            if vehicle.collides_with(self.player):
+                return True
+        return False
+    
+    def log_under_player(self, lane):
+        column = self.player_column()
+        if column is not None and not self.lane_masks(lane)[2] >> column & 1:
+            return None
+        if self.entities is not None:
+            return self.entities.log_under(lane.y, self.player.grid_x)
+        for log in lane.logs:
+            if log.is_player_on(self.player):
+                return log
+        return None
+    
+    def train_hits_player(self, lane):
+        column = self.player_column()
+        if column is not None:
+            return self.lane_masks(lane)[1] >> column & 1 == 1
+        if self.entities is not None:
+            return self.entities.train_hit(lane.y, self.player.grid_x)
+        return lane.train.collides_with(self.player)
+    
+    def visible_lanes(self, camera_y):
+        first_visible = int(camera_y) - LANE_KEEP_BEHIND
+        if self.entities is not None:
+            self.entities.sync(first_visible, first_visible + GRID_HEIGHT + 6)
+        tight = self.quality >= QUALITY_TIGHT
+        for lane in self.lanes.span(first_visible, first_visible + GRID_HEIGHT + 6):
+            # Check if lane is visible on screen
+            lane_screen_y = camera_y + GRID_HEIGHT - 1 - lane.y
+            if tight:
+                # Only lanes with some part on screen
+                if -1 < lane_screen_y < GRID_HEIGHT:
+                    yield lane
+            elif -2 <= lane_screen_y <= GRID_HEIGHT + 2:
+                yield lane
+    
+    def draw(self, alpha=1.0):
+        # alpha: fraction of a step between the previous and current state
+        lag = 1.0 - alpha
+        camera_y = self.camera_y - (self.camera_y - self.prev_camera_y) * lag
+        if self.render_mode == "static":
+            self.draw_static(camera_y, lag)
+            return
+        
+        self.paint(self.screen, camera_y, lag)
+        pygame.display.flip()
+    
+    def paint(self, surface, camera_y, lag=0.0, hud=True):
+        # Draw the whole frame onto any SCREEN_WIDTH x SCREEN_HEIGHT surface
+        surface.fill(BLACK)
         
         # Draw lanes
-        for lane in self.lanes:
-            # Check if lane is visible on screen
-            lane_screen_y = self.camera_y + GRID_HEIGHT - 1 - lane.y
-            if -2 <= lane_screen_y <= GRID_HEIGHT + 2:
-                lane.draw(self.screen, self.camera_y)
+        for lane in self.visible_lanes(camera_y):
+            lane.draw(surface, camera_y, self.sprites, lag=lag, quality=self.quality)
         
         # Draw player
-        self.player.draw(self.screen, self.camera_y)
+        self.player.draw(surface, camera_y, self.sprites, lag=lag)
         
         # Draw UI
-        font = pygame.font.Font(None, 36)
-        score_text = font.render(f"Score: {self.score}", True, WHITE)
-        self.screen.blit(score_text, (10, 10))
-        
-        # Draw eagle warning if idle for too long (after game started)
-        if self.game_started and not self.player.moving:
-            time_left = self.player.max_idle_time - self.player.idle_timer
-            # Show warning in last 2 seconds (120 frames)
-            if time_left < 120:
-                warning_alpha = min(255, (120 - time_left) * 4)
-                # Draw darkening shadow effect
-                shadow = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-                shadow.set_alpha(warning_alpha // 3)
-                shadow.fill(BLACK)
-                self.screen.blit(shadow, (0, 0))
-                
-                # Draw warning text
-                if time_left < 60:  # Flash warning in last second
-                    if time_left % 20 < 10:
-                        warning_font = pygame.font.Font(None, 48)
-                        warning_text = warning_font.render("EAGLE INCOMING!", True, RED)
-                        self.screen.blit(warning_text, 
-                                       (SCREEN_WIDTH // 2 - warning_text.get_width() // 2, 100))
+        if hud:
+            self.hud.draw(surface, self)
+            if self.profiler is not None and self.profiler.overlay:
+                self.profiler.draw(surface)
+    
+    def draw_static(self, camera_y, lag):
+        dirty = []
+        scroll = self.paint_static(self.screen, camera_y, lag, dirty)
         
+        if scroll != self.last_scroll:
+            # The whole world moved on screen
+            pygame.display.update()
+        else:
+            # Repaint where entities are now and where they were last frame
+            pygame.display.update(self.last_dirty + dirty)
+        self.last_scroll = scroll
+        self.last_dirty = dirty
+    
+    def paint_static(self, surface, camera_y, lag=0.0, dirty=None, hud=True):
+        # Static-mode counterpart of paint(): the cached lane strip, with the
+        # entities, player and UI drawn on top; returns the strip's offset
+        if self.static_layer is None:
+            self.static_layer = StaticLayer()
+        self.static_layer.sync(self.lanes, camera_y, self.sprites, self.quality)
+        scroll = self.static_layer.blit(surface, camera_y)
+        
+        for lane in self.visible_lanes(camera_y):
+            lane.draw_entities(surface, camera_y, self.sprites, dirty, lag, self.quality)
+        self.player.draw(surface, camera_y, self.sprites, dirty, lag)
+        if hud:
+            self.hud.draw(surface, self, dirty)
+            if self.profiler is not None and self.profiler.overlay:
+                self.profiler.draw(surface, dirty)
+        return scroll
+    
+    def apply_action(self, action):
+        # UP moves forward (north/increases Y); there is no backward action
         if self.game_over:
-            game_over_font = pygame.font.Font(None, 72)
-            game_over_text = game_over_font.render("GAME OVER", True, RED)
-            restart_text = font.render("Press SPACE to Restart", True, WHITE)
-            
-            self.screen.blit(game_over_text, 
-                           (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, 
-                            SCREEN_HEIGHT // 2 - 50))
-            self.screen.blit(restart_text, 
-                           (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, 
-                            SCREEN_HEIGHT // 2 + 20))
-        
-        pygame.display.flip()
+            return
+        if action is None:
+            return
+        if action not in ACTIONS:
+            raise ValueError(f"unknown action {action!r}, expected one of {sorted(ACTIONS)}")
+        move = ACTIONS[action]
+        if move is not None:
+            if self.recording is not None:
+                self.recording.record(self.frame, action)
+            self.player.move(move[0], move[1], self.lanes)
+    
+    def save_recording(self):
+        # Write out the current run's inputs, if we are recording one
+        if self.recording is None:
+            return
+        self.recording.finish(self)
+        os.makedirs(self.record_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.seed}-{self.frame}.crr"
+        self.recording.save(os.path.join(self.record_dir, name))
+        self.recording = None
+    
+    def snapshot(self):
+        # Capture the game as a Snapshot; restore() brings it back exactly
+        if self.entities is not None:
+            self.entities.sync()
+        player = dict(vars(self.player))
+        log = player.pop("current_log")
+        current_log = None
+        if log is not None:
+            current_log = (log.y, self.lanes.get(log.y).logs.index(log))
+        return Snapshot(self.frame, self.score, self.seed,
+                        tuple([getattr(self, name) for name in self.SNAPSHOT_FIELDS]),
+                        player, current_log, tuple([lane.snapshot() for lane in self.lanes]),
+                        list(self.train_events), self.rng.getstate(), self.generator.snapshot(),
+                        len(self.recording.inputs) if self.recording is not None else None)
+    
+    def restore(self, snapshot):
+        # Put the game back in the state a snapshot() captured. Live lanes
+        # the snapshot saw are kept and have their entities moved back; the
+        # rest are rebuilt (from the pool), and the chicken's log reference
+        # is pointed at whichever log object now stands for its log.
+        self.frame = snapshot.frame
+        self.score = snapshot.score
+        self.seed = snapshot.seed
+        for name, value in zip(self.SNAPSHOT_FIELDS, snapshot.game):
+            setattr(self, name, value)
+        old = self.lanes
+        self.lanes = LaneWindow(GRID_HEIGHT + 20, snapshot.lanes[0][0][0])
+        if self.entities is not None:
+            self.entities.clear()
+        for state in snapshot.lanes:
+            layout = state[0]
+            lane = old.get(layout[0])
+            if lane is not None and lane.layout is layout:
+                lane.reload(state)
+            else:
+                lane = self.lane_from(state)
+            self.lanes.append(lane)
+            if self.entities is not None:
+                self.entities.add_lane(lane)
+        if self.pool is not None:
+            for lane in old:
+                if self.lanes.get(lane.y) is not lane:
+                    self.pool.release(lane)
+        self.train_events = list(snapshot.train_events)
+        self.rng.setstate(snapshot.rng)
+        self.generator.restore(snapshot.generator, self.lane_from)
+        vars(self.player).update(snapshot.player)
+        self.player.current_log = None
+        if snapshot.current_log is not None:
+            lane_y, index = snapshot.current_log
+            self.player.current_log = self.lanes.get(lane_y).logs[index]
+        if self.recording is not None and snapshot.inputs is not None:
+            # Inputs past the snapshot never happened
+            del self.recording.inputs[snapshot.inputs:]
+        if self.static_layer is not None:
+            self.static_layer.invalidate()
+        self.last_scroll = None  # Repaint the whole screen
+    
+    def rewind(self):
+        # Go back to the newest rewind snapshot at least REWIND_INTERVAL
+        # frames old; it stays in the buffer, so pressing again goes further
+        buffer = self.rewind_buffer
+        while buffer and buffer[-1].frame > self.frame - REWIND_INTERVAL:
+            buffer.pop()
+        if buffer:
+            self.restore(buffer[-1])
+            self.input.clear()
+    
+    def step(self, action=None):
+        # Advance the simulation one frame without rendering
+        self.apply_action(action)
+        self.update()
+        return self.score, self.player.alive, self.frame
     
     def handle_input(self):
         for event in pygame.event.get():
@@ -607,33 +2463,203 @@ class Game:
                 return False
             
             if event.type == pygame.KEYDOWN:
-                if self.game_over:
+                if event.key == pygame.K_F3:
+                    self.toggle_overlay()
+                elif event.key in REWIND_KEYS:
+                    self.rewind()
+                elif self.game_over:
                     if event.key == pygame.K_SPACE:
                         self.reset()
-                else:
-                    # UP arrow moves forward (north/increases Y)
-                    if event.key == pygame.K_UP or event.key == pygame.K_w:
-                        self.player.move(0, 1, self.lanes)
-                    # No backward movement allowed
-                    elif event.key == pygame.K_LEFT or event.key == pygame.K_a:
-                        self.player.move(-1, 0, self.lanes)
-                    elif event.key == pygame.K_RIGHT or event.key == pygame.K_d:
-                        self.player.move(1, 0, self.lanes)
+                elif event.key in KEY_ACTIONS:
+                    # pygame's key events carry no time of their own; injected
+                    # ones may bring a perf_counter() timestamp
+                    timestamp = getattr(event, "timestamp", None) or time.perf_counter()
+                    self.input.push(KEY_ACTIONS[event.key], timestamp, self.player.moving)
         
         return True
     
-    def run(self):
+    def apply_queued_input(self):
+        # Start the next buffered move once the chicken has landed
+        queue = self.input
+        if queue.moves and not self.player.moving:
+            action, timestamp, buffered = queue.moves.popleft()
+            self.apply_action(action)
+            if self.player.moving:
+                queue.started.append((timestamp, buffered))
+    
+    def wait_for_frame(self, deadline):
+        # Clock.tick's job, but reading input every input_poll seconds while
+        # it waits, so presses are stamped (and queued) as they arrive
+        # rather than after the wait, and spending the wait on warm-up tasks
+        # while there are any; False once the window is closed
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return True
+            if remaining <= WARM_UP_SLACK or not self.warm_up_step():
+                time.sleep(min(remaining, self.input_poll))
+            if not self.handle_input():
+                return False
+    
+    def warm_up_tasks(self):
+        # What the first frame did not need, prepared in idle time after it
+        if not self.hud.messages_loaded:
+            yield self.hud.load_messages
+        if self.sprites is not None:
+            yield from self.sprites.warm()
+    
+    def warm_up_step(self):
+        # Run the next warm-up task; False once none are left
+        if self.warm_up is None:
+            return False
+        task = next(self.warm_up, None)
+        if task is None:
+            self.warm_up = None
+            return False
+        task()
+        return True
+    
+    def first_frame_shown(self, drawing):
+        # drawing: seconds the first frame took to draw
+        startup = self.startup
+        startup["first_frame"] = drawing
+        startup["total"] = time.perf_counter() - STARTED
+        if self.startup_report:
+            print("startup: " + ", ".join(f"{name.replace('_', ' ')} {startup[name] * 1000:.1f} ms"
+                                          for name in ("import", "init", "game", "first_frame"))
+                  + f"; {startup['total'] * 1000:.1f} ms from import to the first frame")
+        self.warm_up = self.warm_up_tasks()
+    
+    def set_quality(self, quality):
+        if quality != self.quality:
+            if self.static_layer is not None and \
+                    (quality < QUALITY_NO_DECORATIONS) != (self.quality < QUALITY_NO_DECORATIONS):
+                self.static_layer.invalidate()  # Road lines come or go
+            self.quality = quality
+            self.last_scroll = None  # Everything may look different; show the whole next frame
+    
+    def toggle_overlay(self):
+        # F3: show or hide the profiler overlay, profiling only while needed
+        if self.profiler is None:
+            self.profiler = FrameProfiler(budget=self.frame_budget)
+        self.profiler.overlay = not self.profiler.overlay
+        if not self.profiler.overlay and self.profiler.file is None:
+            self.profiler.close()
+            self.profiler = None
+    
+    def run(self, render_fps=FPS, pilot=None):
+        # Fixed-timestep loop: the simulation always advances in SIM_DT steps,
+        # catching up after slow frames, while rendering happens at most once
+        # per pass (capped at render_fps, 0 for uncapped) and interpolates
+        # between the last two simulation states.
+        # pilot, a callable(game) -> action, plays every step in place of the
+        # keyboard (attract mode) and restarts the game a second after a death.
+        if self.headless:
+            raise RuntimeError("a headless Game has no window to run; drive it with step()")
         running = True
+        accumulator = 0.0
+        over_steps = 0
+        self.frame_budget = 1.0 / render_fps if render_fps else SIM_DT
+        if self.profiler is not None:
+            self.profiler.budget = self.frame_budget
+        if self.governor is not None:
+            self.governor.budget = self.frame_budget
+        first_frame = "first_frame" not in self.startup
+        previous = due = time.perf_counter()
         while running:
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.begin_frame()
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+            
             running = self.handle_input()
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
-        
+            if profiler is not None:
+                profiler.mark("input")
+            steps = 0
+            while accumulator >= SIM_DT and steps < MAX_CATCH_UP_STEPS:
+                if pilot is not None:
+                    over_steps = over_steps + 1 if self.game_over else 0
+                    if over_steps > FPS:
+                        self.reset()
+                    self.apply_action(pilot(self))
+                else:
+                    self.apply_queued_input()
+                if profiler is not None:
+                    profiler.mark("pilot")
+                self.update()
+                if not self.game_over and self.frame % REWIND_INTERVAL == 0:
+                    self.rewind_buffer.append(self.snapshot())
+                accumulator -= SIM_DT
+                steps += 1
+            if accumulator >= SIM_DT:
+                # Too far behind to catch up; let the game hitch instead of spiralling
+                accumulator = 0.0
+            
+            drawing = time.perf_counter()
+            self.draw(accumulator / SIM_DT)
+            shown = time.perf_counter()
+            self.input.shown(shown)
+            if first_frame:
+                first_frame = False
+                self.first_frame_shown(shown - drawing)
+            elif self.governor is not None:
+                # Judged on the frame's work, before any wait for the next one
+                self.set_quality(self.governor.update(shown - now))
+            if profiler is not None:
+                profiler.mark("draw")
+            if self.input_poll is not None and render_fps:
+                # Frames fall due every 1 / render_fps; a late one starts the count afresh
+                due = max(due + 1.0 / render_fps, time.perf_counter())
+                running = running and self.wait_for_frame(due)
+            else:
+                self.warm_up_step()  # No idle time to wait for; one task a frame
+                if self.input_poll is None:
+                    self.clock.tick(render_fps)
+            if profiler is not None:
+                profiler.mark("tick")
+                # F3 may have swapped the profiler out mid-frame
+                if profiler is self.profiler:
+                    profiler.end_frame(self)
+        
+        if self.profiler is not None:
+            self.profiler.close()
+            print(self.profiler.summary())
+        self.save_recording()
         pygame.quit()
         sys.exit()
 
 
+IMPORTED = time.perf_counter()
+
+
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Crossy Road")
+    parser.add_argument("--render-mode", choices=["static", "full"], default="static",
+                        help="static: cached lane layer + dirty rects; full: redraw everything")
+    parser.add_argument("--no-sprites", action="store_true",
+                        help="draw entities from primitives instead of cached sprites")
+    parser.add_argument("--render-fps", type=int, default=FPS,
+                        help="cap on rendered frames per second (0 = uncapped); "
+                             "game speed does not depend on it")
+    parser.add_argument("--seed", type=int, help="play the same world every run")
+    parser.add_argument("--record", metavar="DIR",
+                        help="save every run's inputs to DIR for replay.py")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="stream per-frame timings to FILE (.csv, .json or .jsonl); "
+                             "F3 toggles the overlay")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print where the time to the first frame went")
+    parser.add_argument("--input-buffer", type=int, default=INPUT_BUFFER,
+                        help="moves pressed mid-hop that wait for the landing (0 drops them)")
+    parser.add_argument("--quality", choices=["auto"] + [str(level) for level in range(len(QUALITY_NAMES))],
+                        default="auto",
+                        help="render quality: auto adapts it to frame times; 0 (full detail) to "
+                             f"{len(QUALITY_NAMES) - 1} fixes it ({', '.join(QUALITY_NAMES)})")
+    args = parser.parse_args()
+    game = Game(sprites=not args.no_sprites, render_mode=args.render_mode,
+                seed=args.seed, record_dir=args.record, profile=args.profile,
+                input_buffer=args.input_buffer, startup_report=args.startup_report,
+                quality=None if args.quality == "auto" else int(args.quality))
+    game.run(render_fps=args.render_fps)
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""Replay recorded runs headless and check they still end the same way.
+
+Record runs with ``python main.py --record DIR``, then after a change run
+``python replay.py DIR`` to re-simulate every recording as fast as the CPU
+allows and compare each final score and death frame with the recording.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import main
+
+
+def replay(recording, engine="objects"):
+    # Re-run a Recording headless; returns (score, frames, died)
+    game = main.Game(headless=True, engine=engine, seed=recording.seed)
+    inputs = recording.inputs
+    index = 0
+    while not game.game_over and game.frame < recording.frames:
+        while index < len(inputs) and inputs[index][0] == game.frame:
+            game.apply_action(inputs[index][1])
+            index += 1
+        game.update()
+    return game.score, game.frame, game.game_over
+
+
+def verify(path, engine="objects"):
+    # Returns (path, problem or None, frames simulated)
+    try:
+        recording = main.Recording.load(path)
+    except (OSError, ValueError) as exc:
+        return path, str(exc), 0
+    score, frames, died = replay(recording, engine)
+    expected = (recording.score, recording.frames, recording.died)
+    if (score, frames, died) != expected:
+        return path, f"expected score/frames/died {expected}, got {(score, frames, died)}", frames
+    return path, None, frames
+
+
+def find_recordings(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".crr"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="recording files or directories of them")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--engine", choices=["objects", "numpy"], default="objects")
+    args = parser.parse_args()
+
+    paths = list(find_recordings(args.paths))
+    start = time.perf_counter()
+    # Workers are spawned rather than forked from a process that has imported
+    # pygame, and are shut down with close()/join(): once SDL is started it
+    # catches SIGTERM, so Pool.terminate() could leave them running forever.
+    with multiprocessing.get_context("spawn").Pool(args.jobs) as pool:
+        results = pool.starmap(verify, [(path, args.engine) for path in paths], chunksize=16)
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+
+    failures = [(path, problem) for path, problem, _ in results if problem]
+    for path, problem in failures:
+        print(f"MISMATCH {path}: {problem}")
+    frames = sum(result[2] for result in results)
+    print(f"{len(paths) - len(failures)}/{len(paths)} recordings match "
+          f"({frames} frames in {elapsed:.2f}s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,229 @@
+"""A vectorized, render-free environment for training agents on the game.
+
+VecEnv steps N independent headless Games together, Gym style. Every
+observation is written into one preallocated float32 array that the
+caller keeps a reference to; stepping overwrites it in place.
+
+Observation, per game (rows are lanes from ``behind`` below the chicken to
+``ahead`` above it, columns are centred on the chicken):
+
+    grid[channel, row, column]  channels: grass, road, river, train (the
+                                lane type), blocked (trees or off the
+                                board), deadly, platform (see Game.tile_state)
+    scalars[...]                idle timer as a fraction of the eagle's
+                                patience, lanes between the chicken and
+                                the bottom of the screen, the chicken's
+                                offset from its column (logs carry it),
+                                and 1 while it is mid-hop
+
+Actions are main.ACTION_CODES values. The reward is the step's gain in
+Game.score; an episode terminates on game_over and is truncated after
+``max_steps``. Finished games reset themselves (their final observation
+is not kept), and info["episode_score"] holds their final score.
+
+With ``pixels=True`` each game is also drawn, through the same Lane.draw
+and Player.draw code as the window, onto an offscreen surface whose
+memory is a slice of ``env.frames``; pass ``pixel_size`` to downscale,
+``grayscale`` for one channel and ``render_every`` to draw only every
+k-th step. See PixelRenderer.
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import random
+
+import numpy as np
+import pygame
+
+import main
+
+LANE_CODES = {"grass": 0, "road": 1, "river": 2, "train": 3}
+CHANNELS = ("grass", "road", "river", "train", "blocked", "deadly", "platform")
+SCALARS = ("idle", "camera", "offset", "moving")
+
+
+class PixelRenderer:
+    # Draws a Game into a NumPy array without a window and without copying
+    # (with the game's own render_mode, static by default): the output
+    # surface is built over the array's memory (pygame.image.frombuffer), so
+    # drawing writes the pixels in place. The memory is laid out B, G, R, X
+    # like pygame's native surfaces, which keeps blits off the slow
+    # format-converting path; ``pixels`` is an (H, W, 3) RGB view of it, or
+    # (H, W) when grayscale, refreshed by render(). Scaled frames are drawn
+    # at full size first, then scaled to ``size`` (nearest neighbour, or
+    # smoothscale's filtering with smooth=True, ~20x slower).
+    def __init__(self, size=None, grayscale=False, smooth=False, hud=False, buffer=None):
+        # buffer: a C-contiguous (H, W, 4) uint8 array to draw into (e.g. a
+        # slice of a batch); allocated if not given
+        width, height = size or (main.SCREEN_WIDTH, main.SCREEN_HEIGHT)
+        if buffer is None:
+            buffer = np.zeros((height, width, 4), dtype=np.uint8)
+        if buffer.shape != (height, width, 4) or not buffer.flags.c_contiguous:
+            raise ValueError(f"buffer must be a contiguous ({height}, {width}, 4) uint8 array")
+        self.buffer = buffer
+        self.size = (width, height)
+        self.grayscale = grayscale
+        self.smooth = smooth
+        self.hud = hud
+        self.output = pygame.image.frombuffer(buffer, self.size, "BGRA")
+        # Full-size canvas to draw on, and the scaled frame before grayscale,
+        # whenever the output surface cannot play those parts itself
+        full = (main.SCREEN_WIDTH, main.SCREEN_HEIGHT)
+        scaled = self.size != full
+        self.canvas = pygame.Surface(full) if scaled or grayscale else self.output
+        self.scaled = pygame.Surface(self.size) if scaled and grayscale else self.output
+        # R, G and B hold the same value after grayscale; expose one of them
+        self.pixels = buffer[..., 0] if grayscale else buffer[..., 2::-1]
+
+    def render(self, game):
+        if game.render_mode == "static":
+            game.paint_static(self.canvas, game.camera_y, hud=self.hud)
+        else:
+            game.paint(self.canvas, game.camera_y, hud=self.hud)
+        if self.canvas is not self.output:
+            source = self.canvas
+            if self.size != source.get_size():
+                scale = pygame.transform.smoothscale if self.smooth else pygame.transform.scale
+                scale(source, self.size, self.scaled)
+                source = self.scaled
+            if self.grayscale:
+                pygame.transform.grayscale(source, self.output)
+        return self.pixels
+
+
+class VecEnv:
+    def __init__(self, num_envs, behind=2, ahead=8, half_width=5, max_steps=None,
+                 seed=None, engine="objects", pixels=False, pixel_size=None,
+                 grayscale=False, render_every=1):
+        self.num_envs = num_envs
+        self.behind = behind
+        self.ahead = ahead
+        self.half_width = half_width
+        self.max_steps = max_steps
+        self.seeds = random.Random(seed)
+        rows, columns = behind + ahead + 1, 2 * half_width + 1
+        self.shape = (len(CHANNELS), rows, columns)
+        # Only the lanes the observation can see need simulating every step,
+        # unless the whole screen is drawn
+        band = main.ACTIVE_BAND if pixels else (main.LANE_KEEP_BEHIND, ahead + 3)
+        self.games = [main.Game(headless=True, engine=engine, active_band=band)
+                      for _ in range(num_envs)]
+
+        # The one buffer handed to the caller, and named views into it
+        grid_size = len(CHANNELS) * rows * columns
+        self.obs = np.zeros((num_envs, grid_size + len(SCALARS)), dtype=np.float32)
+        self.grid = self.obs[:, :grid_size].reshape((num_envs,) + self.shape)
+        self.scalars = self.obs[:, grid_size:]
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.terminated = np.zeros(num_envs, dtype=bool)
+        self.truncated = np.zeros(num_envs, dtype=bool)
+        self.episode_score = np.full(num_envs, -1, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+
+        # Scratch space: lane type codes and the window's (blocked, deadly,
+        # platform) bitmasks per row, expanded to bits with out= ufuncs
+        self.lane_types = np.full((num_envs, rows), -1, dtype=np.int64)
+        self.masks = np.zeros((num_envs, 3, rows), dtype=np.int64)
+        self.shifts = np.arange(columns, dtype=np.int64)
+        self.bits = np.zeros((num_envs, 3, rows, columns), dtype=np.int64)
+        self.type_hits = np.zeros((num_envs, 4, rows, columns), dtype=bool)
+        self.type_codes = np.arange(4, dtype=np.int64)[None, :, None, None]
+        # Off-board columns either side of the chicken read as blocked (a log
+        # can carry it half a tile past the right edge, to column GRID_WIDTH)
+        margin = (1 << half_width) - 1
+        self.off_board = margin | ((margin << 1 | 1) << (main.GRID_WIDTH + half_width))
+        self.window = (1 << columns) - 1
+
+        # Pixel frames: one (N, H, W, 4) array, each game's renderer drawing
+        # into its own slice; ``frames`` views the channels that matter
+        self.render_every = render_every
+        self.renderers = None
+        self.frames = None
+        if pixels:
+            width, height = pixel_size or (main.SCREEN_WIDTH, main.SCREEN_HEIGHT)
+            self.pixel_buffer = np.zeros((num_envs, height, width, 4), dtype=np.uint8)
+            self.renderers = [PixelRenderer(pixel_size, grayscale, buffer=self.pixel_buffer[index])
+                              for index in range(num_envs)]
+            self.frames = self.pixel_buffer[..., 0] if grayscale else self.pixel_buffer[..., 2::-1]
+            self.total_steps = 0
+
+    def reset(self, seed=None):
+        # Start every game afresh; returns the observation buffer
+        if seed is not None:
+            self.seeds.seed(seed)
+        for index, game in enumerate(self.games):
+            self.reset_game(index, game)
+            self.observe(index, game)
+        self.expand()
+        if self.renderers is not None:
+            self.total_steps = 0
+            self.render()
+        return self.obs
+
+    def render(self):
+        # Draw every game into env.frames
+        for renderer, game in zip(self.renderers, self.games):
+            renderer.render(game)
+
+    def reset_game(self, index, game):
+        game.reset(seed=self.seeds.randrange(2 ** 32))
+        self.steps[index] = 0
+
+    def step(self, actions):
+        # actions: one ACTION_CODES value per game. Returns the (reused)
+        # buffers (obs, rewards, terminated, truncated, info)
+        self.episode_score.fill(-1)
+        for index, (game, code) in enumerate(zip(self.games, actions)):
+            score = game.score
+            game.step(main.CODE_ACTIONS[int(code)])
+            self.steps[index] += 1
+            self.rewards[index] = game.score - score
+            terminated = game.game_over
+            truncated = not terminated and self.max_steps is not None \
+                and self.steps[index] >= self.max_steps
+            self.terminated[index] = terminated
+            self.truncated[index] = truncated
+            if terminated or truncated:
+                self.episode_score[index] = game.score
+                self.reset_game(index, game)
+            self.observe(index, game)
+        self.expand()
+        if self.renderers is not None:
+            self.total_steps += 1
+            if self.total_steps % self.render_every == 0:
+                self.render()
+        return self.obs, self.rewards, self.terminated, self.truncated, {
+            "episode_score": self.episode_score}
+
+    def observe(self, index, game):
+        # Gather one game's lane types, masks and scalars into the scratch rows
+        player = game.player
+        column = int(round(player.grid_x))
+        half = self.half_width
+        lane_types = self.lane_types[index]
+        blocked, deadly, platform = self.masks[index]
+        for row, y in enumerate(range(player.grid_y - self.behind, player.grid_y + self.ahead + 1)):
+            lane = game.lanes.get(y)
+            if lane is None:
+                lane_types[row] = -1
+                blocked[row] = self.window
+                deadly[row] = platform[row] = 0
+                continue
+            lane_types[row] = LANE_CODES[lane.type]
+            masks = game.lane_masks(lane)
+            blocked[row] = ((masks[0] << half | self.off_board) >> column) & self.window
+            deadly[row] = (masks[1] << half >> column) & self.window
+            platform[row] = (masks[2] << half >> column) & self.window
+        scalars = self.scalars[index]
+        scalars[0] = player.idle_timer / player.max_idle_time
+        scalars[1] = player.grid_y - game.camera_y
+        scalars[2] = player.grid_x - column
+        scalars[3] = player.moving
+
+    def expand(self):
+        # Turn the gathered codes and bitmasks into the grid channels, in place
+        np.right_shift(self.masks[..., None], self.shifts, out=self.bits)
+        np.bitwise_and(self.bits, 1, out=self.bits)
+        np.copyto(self.grid[:, 4:], self.bits)
+        np.equal(self.lane_types[:, None, :, None], self.type_codes, out=self.type_hits)
+        np.copyto(self.grid[:, :4], self.type_hits)
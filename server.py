@@ -0,0 +1,539 @@
+"""Serve one seeded world to racers and spectators over local TCP.
+
+The server runs the authoritative, headless ``Game.update`` loop at the
+simulation rate: one Game per racer, all on the same seed, so every racer
+gets the same lanes (speeds still follow each racer's own score). Clients
+connect over TCP and exchange newline-delimited JSON messages:
+
+    client -> server   {"join": "race"} or {"join": "watch"} first, then a
+                       racer's {"move": "up"|"left"|"right"} and
+                       {"restart": 1} after a death
+    server -> client   {"welcome": {"seed": ..., "racer": id or null}}, then
+                       {"t": tick, "g": [[racer id, delta], ...], "x": [gone ids]}
+
+Each tick carries only what changed, per racer: "r" the frame a run
+(re)started at, "p" the chicken's [x, y], "c" the camera, "s" the score,
+"o" [death cause, frame], "lo" the lowest lane kept, "l" new lanes as
+Lane.snapshot() tuples, and "tr" trains that started a run, as [lane y,
+frame, [active, x, warning timer]]. Vehicles, logs and trains are never
+streamed: clients carry them forward in closed form from the snapshot,
+as dormant lanes are (see WorldView). New lanes share a per-tick byte
+budget and otherwise wait, since lanes are generated well ahead of the
+screen. The tick is encoded once and the same bytes go to every client; a
+client too slow to drain them is skipped, then resynced with a full
+keyframe.
+
+Run ``python server.py serve``, then ``python server.py watch`` (``--race``
+to play) in other terminals; ``python server.py load --clients 48``
+measures tick cost and bandwidth with that many spectators.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import socket
+import sys
+import time
+
+import pygame
+
+import main
+
+PORT = 8765
+MAX_TICK_BYTES = 4096      # Broadcast budget per tick; new lanes past it wait
+MAX_BACKLOG = 256 * 1024   # Unsent bytes before a client is skipped, then resynced
+TICK_SAMPLES = main.FPS * 60  # Ticks the stats cover
+
+
+def encode(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def decode(line):
+    # A client's message; anything but a JSON object is nonsense too
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError(f"expected a JSON object, got {type(message).__name__}")
+    return message
+
+
+class Racer:
+    # One player's authoritative Game, and what the stream has told clients
+    # about it so far
+    def __init__(self, racer_id, seed, pilot=None):
+        self.id = racer_id
+        self.game = main.Game(headless=True, seed=seed)
+        self.pilot = pilot  # A callable(game) -> action (see autopilot.py); None for a client
+        self.restart = False
+        self.over_steps = 0
+        self.forget()
+
+    def forget(self):
+        # A new run: nothing about it has been sent
+        lanes = self.game.lanes
+        self.lanes = lanes
+        self.low = lanes.start
+        self.next_lane = lanes.start  # Lanes below this have been sent
+        self.sent = {}
+        self.trains = {}  # Lane y -> (frame, train state) clients last got
+
+    def step(self):
+        game = self.game
+        if self.pilot is not None:
+            # Bots restart a second after a death, like Game.run's pilot
+            self.over_steps = self.over_steps + 1 if game.game_over else 0
+            if self.over_steps > main.FPS:
+                game.reset()
+            game.apply_action(self.pilot(game))
+        else:
+            if self.restart and game.game_over:
+                game.reset()
+            self.restart = False
+            game.apply_queued_input()
+        game.update()
+
+    def change(self, delta, key, value):
+        if self.sent.get(key) != value:
+            self.sent[key] = delta[key] = value
+
+    def delta(self, budget):
+        # What changed since the last tick; returns (delta, bytes of new lanes)
+        game = self.game
+        if game.lanes is not self.lanes:
+            self.forget()
+        delta = {}
+        if not self.sent:
+            delta["r"] = game.frame
+        self.change(delta, "p", [game.player.x, game.player.y])
+        self.change(delta, "c", game.camera_y)
+        self.change(delta, "s", game.score)
+        if game.game_over:
+            self.change(delta, "o", [game.death_cause, game.frame])
+        lanes = game.lanes
+        if lanes.start != self.low:
+            self.low = delta["lo"] = lanes.start
+            for y in [y for y in self.trains if y < self.low]:
+                del self.trains[y]
+        self.next_lane = max(self.next_lane, self.low)
+
+        # Trains whose state clients cannot foresee from the last one they
+        # got: a warning has started since (see Train.state_after)
+        runs = []
+        for y, (frame, (active, x, warning_timer)) in self.trains.items():
+            lane = lanes[y]
+            train = lane.train
+            foreseen = main.train_state_after(x, train.speed, train.direction, train.length,
+                                              active, warning_timer, lane.frame - frame)
+            state = (train.active, train.x, train.warning_timer)
+            if foreseen[0] != state[0] or foreseen[2] != state[2]:
+                self.trains[y] = (lane.frame, state)
+                runs.append([y, lane.frame, state])
+        if runs:
+            delta["tr"] = runs
+
+        new = []
+        used = 0
+        while self.next_lane < len(lanes) and used < budget:
+            state = lanes[self.next_lane].snapshot()
+            if state[3] is not None:
+                self.trains[self.next_lane] = (state[1], state[3])
+            new.append(state)
+            used += len(json.dumps(state)) + 1
+            self.next_lane += 1
+        if new:
+            delta["l"] = new
+        return delta, used
+
+    def keyframe(self):
+        # Everything sent so far, for a client that has seen none of it
+        game = self.game
+        frame = {"r": game.frame, "lo": self.low}
+        frame.update(self.sent)
+        frame["l"] = [game.lanes[y].snapshot() for y in range(self.low, self.next_lane)]
+        return frame
+
+
+class Client:
+    __slots__ = ("writer", "racer", "stale")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.racer = None
+        self.stale = False  # Skipped while too far behind; owed a keyframe
+
+
+class Server:
+    def __init__(self, seed=None, bots=0, bot_budget=0.001):
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.racers = {}
+        self.next_id = 0
+        self.clients = []
+        self.joining = []  # Connected, waiting for their first keyframe
+        self.gone = []     # Racers left since the last tick
+        self.ticks = 0
+        self.late = 0      # Ticks started more than MAX_CATCH_UP_STEPS late, then dropped
+        self.tick_times = collections.deque(maxlen=TICK_SAMPLES)
+        self.tick_bytes = collections.deque(maxlen=TICK_SAMPLES)
+        self.keyframes = 0
+        self.most_clients = 0
+        if bots:
+            import autopilot
+            for _ in range(bots):
+                self.add_racer(autopilot.Autopilot(budget=bot_budget))
+
+    def add_racer(self, pilot=None):
+        racer = self.racers[self.next_id] = Racer(self.next_id, self.seed, pilot)
+        self.next_id += 1
+        return racer
+
+    async def serve(self, host="127.0.0.1", port=PORT):
+        server = await asyncio.start_server(self.serve_client, host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        async with server:
+            await self.run_ticks()
+
+    async def run_ticks(self):
+        # Fixed-rate ticks; after a long stall the lost time is dropped
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while True:
+            self.tick()
+            due += main.SIM_DT
+            now = loop.time()
+            if now - due > main.SIM_DT * main.MAX_CATCH_UP_STEPS:
+                self.late += 1
+                due = now
+            await asyncio.sleep(max(0.0, due - now))
+
+    def tick(self):
+        started = time.perf_counter()
+        self.ticks += 1
+        for racer in self.racers.values():
+            racer.step()
+        message = {"t": self.ticks}
+        budget = MAX_TICK_BYTES
+        games = []
+        # Racers take turns at the front of the lane budget
+        racers = list(self.racers.values())
+        first = self.ticks % len(racers) if racers else 0
+        for racer in racers[first:] + racers[:first]:
+            delta, used = racer.delta(budget)
+            budget -= used
+            if delta:
+                games.append([racer.id, delta])
+        if games:
+            message["g"] = games
+        if self.gone:
+            message["x"] = self.gone
+            self.gone = []
+        # Sent even when empty: the tick number is the clients' clock
+        data = encode(message)
+
+        keyframe = None
+        for client in self.clients:
+            backlog = client.writer.transport.get_write_buffer_size()
+            if backlog > MAX_BACKLOG:
+                client.stale = True
+            elif client.stale:
+                if backlog < MAX_BACKLOG // 4:
+                    keyframe = keyframe or self.keyframe()
+                    client.writer.write(keyframe)
+                    client.stale = False
+            else:
+                client.writer.write(data)
+        if self.joining:
+            keyframe = keyframe or self.keyframe()
+            for client in self.joining:
+                client.writer.write(keyframe)
+            self.clients += self.joining
+            self.joining = []
+            self.most_clients = max(self.most_clients, len(self.clients))
+        self.tick_times.append(time.perf_counter() - started)
+        self.tick_bytes.append(len(data))
+
+    def keyframe(self):
+        self.keyframes += 1
+        return encode({"t": self.ticks, "g": [[racer.id, racer.keyframe()]
+                                              for racer in self.racers.values()]})
+
+    async def serve_client(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=MAX_BACKLOG)
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = Client(writer)
+        try:
+            hello = decode(await reader.readline() or b"{}")
+            if hello.get("join") == "race":
+                client.racer = self.add_racer()
+            writer.write(encode({"welcome": {
+                "seed": self.seed, "racer": client.racer.id if client.racer else None}}))
+            self.joining.append(client)
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.receive(client, decode(line))
+        except (ConnectionError, ValueError):
+            pass  # Gone, or talking nonsense; either way, done with it
+        finally:
+            self.drop(client)
+            writer.close()
+
+    def receive(self, client, message):
+        racer = client.racer
+        if racer is None:
+            return  # Spectators only watch
+        game = racer.game
+        action = message.get("move")
+        if action in main.ACTIONS and action != "none":
+            game.input.push(action, time.perf_counter(), game.player.moving)
+        if message.get("restart"):
+            racer.restart = True
+
+    def drop(self, client):
+        for clients in (self.clients, self.joining):
+            if client in clients:
+                clients.remove(client)
+        if client.racer is not None and client.racer.id in self.racers:
+            del self.racers[client.racer.id]
+            self.gone.append(client.racer.id)
+
+    def stats(self):
+        times = sorted(self.tick_times)
+        sizes = self.tick_bytes
+        if not times:
+            return "no ticks yet"
+        return (f"{self.ticks} ticks ({self.late} dropped late), {len(self.clients)} clients "
+                f"({self.most_clients} at most), "
+                f"{len(self.racers)} racers; tick p50 {times[len(times) // 2] * 1000:.3f} ms "
+                f"p99 {times[int(len(times) * 0.99)] * 1000:.3f} ms; "
+                f"{sum(sizes) / len(sizes):.0f} B/tick mean, {max(sizes)} max, "
+                f"{self.keyframes} keyframes")
+
+
+class WorldView:
+    # A client's copy of one racer's world, rebuilt from the stream. Lanes
+    # are made from their snapshots and, like dormant lanes in Game, only
+    # brought forward (in closed form) when looked at; the frame advances
+    # with the server's ticks until the run ends.
+    def __init__(self):
+        self.lanes = {}
+        self.player = main.Player(main.GRID_WIDTH // 2, 0)
+        self.camera_y = 0
+        self.score = 0
+        self.death = None
+        self.frame = self.tick = 0
+
+    def advance(self, tick):
+        # The server has reached `tick`
+        if self.death is None:
+            self.frame += tick - self.tick
+        self.tick = tick
+
+    def apply(self, delta):
+        if "r" in delta:
+            self.lanes.clear()
+            self.frame = delta["r"]
+            self.death = None
+        if "o" in delta:
+            self.death, self.frame = delta["o"]
+        if "p" in delta:
+            player = self.player
+            player.prev_x, player.prev_y = player.x, player.y
+            player.x, player.y = delta["p"]
+        self.camera_y = delta.get("c", self.camera_y)
+        self.score = delta.get("s", self.score)
+        for state in delta.get("l", ()):
+            layout = state[0]
+            lane = main.Lane(layout[0], None, layout[2], layout[3])
+            lane.restore(state)
+            self.lanes[lane.y] = lane
+        for y, frame, train in delta.get("tr", ()):
+            lane = self.lanes.get(y)
+            if lane is not None:
+                self.bring(lane, frame)
+                lane.train.active, lane.train.x, lane.train.warning_timer = train
+        if "lo" in delta:
+            for y in [y for y in self.lanes if y < delta["lo"]]:
+                del self.lanes[y]
+
+    def lane(self, y):
+        # Lane y as it is at the current frame, or None if not sent (yet)
+        lane = self.lanes.get(y)
+        if lane is not None:
+            self.bring(lane, self.frame)
+        return lane
+
+    @staticmethod
+    def bring(lane, frame):
+        # Game.catch_up, for a lane the client holds
+        steps = frame - lane.frame
+        if steps > 0:
+            lane.catch_up(steps)
+            lane.frame = frame
+
+
+def follow(views, message):
+    # Apply one server message to views (racer id -> WorldView)
+    tick = message["t"]
+    for view in views.values():
+        view.advance(tick)
+    for racer_id, delta in message.get("g", ()):
+        view = views.get(racer_id)
+        if view is None:
+            view = views[racer_id] = WorldView()
+            view.tick = tick
+        view.apply(delta)
+    for racer_id in message.get("x", ()):
+        views.pop(racer_id, None)
+
+
+def watch(args):
+    # A window on the stream; with --race, also a racer playing from it
+    sock = socket.create_connection((args.host, args.port))
+    sock.sendall(encode({"join": "race" if args.race else "watch"}))
+    sock.setblocking(False)
+    main.init_display()
+    screen = pygame.display.set_mode((main.SCREEN_WIDTH, main.SCREEN_HEIGHT))
+    pygame.display.set_caption("Crossy Road - " + ("racing" if args.race else "watching"))
+    sprites = main.SpriteCache()
+    font = main.load_font(36)
+    clock = pygame.time.Clock()
+    views = {}
+    mine = following = None
+    pending = b""
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_TAB and views:
+                    # Follow the next racer
+                    ids = sorted(views)
+                    following = ids[(ids.index(following) + 1) % len(ids) if following in ids else 0]
+                elif mine is not None and event.key in main.KEY_ACTIONS:
+                    sock.sendall(encode({"move": main.KEY_ACTIONS[event.key]}))
+                elif mine is not None and event.key == pygame.K_SPACE:
+                    sock.sendall(encode({"restart": 1}))
+        try:
+            data = sock.recv(1 << 16)
+        except BlockingIOError:
+            data = None
+        if data == b"":
+            print("server closed the connection")
+            return
+        if data:
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                message = json.loads(line)
+                if "welcome" in message:
+                    mine = message["welcome"]["racer"]
+                    following = mine
+                else:
+                    follow(views, message)
+
+        view = views.get(following)
+        if view is None and views:
+            view = views[min(views)]
+        screen.fill(main.BLACK)
+        if view is not None:
+            camera_y = view.camera_y
+            for y in range(int(camera_y) - 2, int(camera_y) + main.GRID_HEIGHT + 2):
+                lane = view.lane(y)
+                if lane is not None:
+                    lane.draw(screen, camera_y, sprites)
+            view.player.draw(screen, camera_y, sprites)
+            text = f"Score: {view.score}" + (f"  ({view.death})" if view.death else "")
+            screen.blit(font.render(text, True, main.WHITE), (10, 10))
+        pygame.display.flip()
+        clock.tick(main.FPS)
+
+
+async def spectate(host, port, count, seconds):
+    # count spectators reading (and following) the stream for `seconds`;
+    # returns bytes received per client
+    async def one():
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(encode({"join": "watch"}))
+        views = {}
+        received = 0
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            line = await reader.readline()
+            if not line:
+                break
+            received += len(line)
+            message = json.loads(line)
+            if "welcome" not in message:
+                follow(views, message)
+        writer.close()
+        return received
+    return await asyncio.gather(*[one() for _ in range(count)])
+
+
+def spectators(args):
+    received = asyncio.run(spectate(args.host, args.port, args.clients, args.seconds))
+    print(f"{len(received)} spectators, {sum(received) / len(received) / args.seconds / 1024:.1f} "
+          f"KiB/s each")
+
+
+def load(args):
+    # A server with bot racers, and --clients spectators in a second process
+    server = Server(args.seed, bots=args.bots)
+
+    async def session():
+        serving = asyncio.ensure_future(server.serve(args.host, 0))
+        while not hasattr(server, "port"):
+            await asyncio.sleep(0.01)
+        clients = await asyncio.create_subprocess_exec(
+            sys.executable, __file__, "spectators", "--port", str(server.port),
+            "--clients", str(args.clients), "--seconds", str(args.seconds))
+        await clients.wait()
+        serving.cancel()
+
+    try:
+        asyncio.run(session())
+    except asyncio.CancelledError:
+        pass
+    print(server.stats())
+
+
+def serve(args):
+    server = Server(args.seed, bots=args.bots)
+
+    async def session():
+        serving = asyncio.ensure_future(server.serve(args.host, args.port))
+        while True:
+            await asyncio.sleep(args.stats_every or 3600)
+            if args.stats_every:
+                print(server.stats())
+            if serving.done():
+                return serving.result()
+
+    try:
+        asyncio.run(session())
+    except KeyboardInterrupt:
+        print(server.stats())
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["serve", "watch", "load", "spectators"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--seed", type=int, help="serve: the world every racer plays")
+    parser.add_argument("--bots", type=int, default=0, help="serve/load: autopilot racers")
+    parser.add_argument("--stats-every", type=float, default=10,
+                        help="serve: seconds between stats lines (0 = never)")
+    parser.add_argument("--race", action="store_true", help="watch: join as a racer")
+    parser.add_argument("--clients", type=int, default=48, help="load: spectators")
+    parser.add_argument("--seconds", type=float, default=10, help="load: how long")
+    args = parser.parse_args()
+    if args.command == "load" and not args.bots:
+        args.bots = 2
+    {"serve": serve, "watch": watch, "load": load, "spectators": spectators}[args.command](args)
+
+
+if __name__ == "__main__":
+    main_cli()